@@ -0,0 +1,77 @@
+"""
+Measure import time of process entry modules (python -X importtime, needs python3.7+).
+Shows total time, slowest top-level packages and whether streaming-only dependencies were loaded.
+    python3 benchmarks/import_time.py [--repeat 5] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = [
+    ("package", "import twitter_classifier"),
+    ("api process", "import twitter_classifier.server; import twitter_classifier.logic"),
+    ("stream process", "import twitter_classifier.server; import twitter_classifier.twitter; "
+                       "import twitter_classifier.watson_nlc"),
+]
+
+STREAM_ONLY = ["peony", "aiohttp"]
+
+
+def import_times(code):
+    """
+    Run code in new interpreter with -X importtime
+    :return: top-level package - cumulative microseconds dict, total microseconds, all imported modules
+    :rtype: (dict[str, int], int, set[str])
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                             cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             universal_newlines=True)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+    packages = {}
+    total = 0
+    modules = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        modules.add(name.strip())
+        # top-level imports are not indented
+        if name.startswith("  ") or name.strip() == "":
+            continue
+        name = name.strip()
+        packages[name.split(".")[0]] = packages.get(name.split(".")[0], 0) + int(cumulative)
+        total += int(cumulative)
+    return packages, total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of entry modules")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for title, code in TARGETS:
+        try:
+            runs = [import_times(code) for _ in range(args.repeat)]
+        except RuntimeError as err:
+            print("{0}: can't import ({1})".format(title, err))
+            continue
+        totals = [total for _, total, _ in runs]
+        packages, _, modules = runs[-1]
+        print("{0}: {1:.1f}ms (median of {2})".format(title, statistics.median(totals) / 1000, args.repeat))
+        for name, value in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print("    {0:<28} {1:8.1f}ms".format(name, value / 1000))
+        loaded = [name for name in STREAM_ONLY if name in modules]
+        print("    streaming-only packages loaded: {0}".format(", ".join(loaded) if loaded else "none"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Compare JSON backends (see twitter_classifier.serialization) and response compression
+for typical (/stats), medium (/stocks) and large (export-like) answers.
+    python3 benchmarks/json_encoding.py [--rows 20000] [--level 6]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import timeit
+import zlib
+
+# run from repository root without installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from twitter_classifier import serialization
+
+
+WORDS = ["stock", "market", "bull", "bear", "buy", "sell", "earnings", "call", "put", "rally",
+         "crash", "yield", "bond", "growth", "revenue", "guidance", "beat", "miss", "short", "long"]
+
+
+def payloads(rows):
+    rnd = random.Random(0)
+    started = datetime.datetime(2017, 3, 6)
+    stats = {"success": True, "response": {"positive": 0.41, "negative": 0.23, "neutral": 0.36}}
+    stocks = {"success": True, "response": {"STOCK{0}".format(i): "$STOCK{0}".format(i) for i in range(500)}}
+    export = {"success": True, "response": [
+        {
+            "id": i,
+            "time": (started + datetime.timedelta(seconds=i)).isoformat(),
+            "uid": rnd.randint(1, 10 ** 9),
+            "text": " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(5, 20))),
+            "classification": rnd.choice(["positive", "negative", "neutral"])
+        } for i in range(rows)
+    ]}
+    return [("stats", stats), ("stocks", stocks), ("large ({0} rows)".format(rows), export)]
+
+
+def measure(function, min_time=0.2):
+    """
+    :return: seconds per call (best of 3)
+    :rtype: float
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(3, number)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON encoding and compression of answers")
+    parser.add_argument("--rows", type=int, default=20000, help="rows of large answer")
+    parser.add_argument("--level", type=int, default=1, help="zlib compression level")
+    args = parser.parse_args()
+
+    backends = serialization.available()
+    for title, payload in payloads(args.rows):
+        print(title)
+        data = None
+        for name in backends:
+            serialization.use(name)
+            data = serialization.dumps(payload)
+            print("    encode {0:<8} {1:10.1f}us".format(name, measure(lambda: serialization.dumps(payload)) * 1e6))
+        print("    identity        {0:10d} bytes".format(len(data)))
+        for encoding, wbits in [("gzip", 16 + zlib.MAX_WBITS), ("deflate", zlib.MAX_WBITS)]:
+            def _compress():
+                compressor = zlib.compressobj(args.level, zlib.DEFLATED, wbits)
+                return compressor.compress(data) + compressor.flush()
+            print("    {0:<15} {1:10d} bytes, {2:10.1f}us".format(
+                encoding, len(_compress()), measure(_compress) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
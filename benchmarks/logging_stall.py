@@ -0,0 +1,91 @@
+"""
+Compare event loop stalls of print() and non-blocking logging with slow stdout consumer.
+Stdout is replaced by pipe which is read by thread at limited speed,
+    loop processes simulated tweets (3 log lines per tweet) while ticker measures loop lag.
+    python3 benchmarks/logging_stall.py [--tweets 3000] [--consumer-speed 200000]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+
+# run from repository root without installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from twitter_classifier import log
+
+
+def slow_reader(fd, speed):
+    with os.fdopen(fd, "rb", buffering=0) as src:
+        while True:
+            chunk = src.read(4096)
+            if not chunk:
+                return
+            time.sleep(len(chunk) / speed)
+
+
+async def ticker(lags, stop):
+    loop = asyncio.get_event_loop()
+    interval = 0.001
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - expected)
+
+
+async def produce(tweets, write_line):
+    for i in range(tweets):
+        write_line(i, "stored")
+        write_line(i, "mapped")
+        write_line(i, "classified")
+        await asyncio.sleep(0)
+
+
+async def run_case(tweets, write_line):
+    lags = []
+    stop = asyncio.Event()
+    ticker_task = asyncio.ensure_future(ticker(lags, stop))
+    started = time.perf_counter()
+    await produce(tweets, write_line)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker_task
+    return elapsed, max(lags) if lags else 0.0, sum(lags) / len(lags) if lags else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark event loop stalls caused by logging")
+    parser.add_argument("--tweets", type=int, default=3000)
+    parser.add_argument("--consumer-speed", type=float, default=200000, help="pipe reader speed (bytes/s)")
+    args = parser.parse_args()
+    loop = asyncio.get_event_loop()
+
+    read_fd, write_fd = os.pipe()
+    reader = threading.Thread(target=slow_reader, args=(read_fd, args.consumer_speed))
+    reader.start()
+    output = os.fdopen(write_fd, "w", buffering=1)
+
+    def _print(i, stage):
+        print("Tweet {0} {1} with some additional text to make line longer".format(i, stage), file=output)
+
+    print_result = loop.run_until_complete(run_case(args.tweets, _print))
+
+    log.setup(logging.INFO, sampling={}, stream=output, queue_size=args.tweets * 3)
+
+    def _event(i, stage):
+        log.event("tweet_" + stage, tweet_id=i, comment="with some additional text to make line longer")
+
+    log_result = loop.run_until_complete(run_case(args.tweets, _event))
+    log.shutdown()
+    output.close()
+    reader.join()
+
+    for name, (elapsed, max_lag, mean_lag) in [("print()", print_result), ("log.event()", log_result)]:
+        print("{0:<12} loop busy {1:8.3f}s, max stall {2:8.2f}ms, mean stall {3:6.2f}ms".format(
+            name, elapsed, max_lag * 1000, mean_lag * 1000))
+
+
+if __name__ == '__main__':
+    main()
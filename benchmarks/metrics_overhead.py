@@ -0,0 +1,67 @@
+"""
+Microbenchmark of metrics instrumentation overhead.
+Measures cost of single metric operations and of full per-tweet instrumentation
+    (same set of updates which ingest loop makes for one mapped and classified tweet).
+    python3 benchmarks/metrics_overhead.py [--iterations 200000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+# run from repository root without installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from twitter_classifier.metrics import Registry, TWEETS_RECEIVED, STREAM_LAG, STAGE_LATENCY, \
+    CLASSIFIER_CALLS, DB_POOL_WAIT, CACHE_LOOKUPS
+
+
+def per_tweet():
+    TWEETS_RECEIVED.inc()
+    with clean_latency.time():
+        pass
+    STREAM_LAG.observe(1.5)
+    for _ in range(4):
+        DB_POOL_WAIT.observe(0.0001)
+    for stage in stages:
+        with stage.time():
+            pass
+    classification_misses.inc()
+    for _ in range(3):
+        classifier_ok.inc()
+
+
+clean_latency = STAGE_LATENCY.labels("clean")
+stages = [STAGE_LATENCY.labels(stage) for stage in ["store", "match", "classify", "update"]]
+classification_misses = CACHE_LOOKUPS.labels("classification", "miss")
+classifier_ok = CLASSIFIER_CALLS.labels("200")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark metrics overhead")
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    registry = Registry()
+    counter = registry.counter("bench_counter", "counter")
+    labeled = registry.counter("bench_labeled", "labeled counter", ["status"])
+    histogram = registry.histogram("bench_histogram", "histogram")
+    child = labeled.labels("200")
+    cases = [
+        ("counter.inc()", lambda: counter.inc()),
+        ("labels(...).inc()", lambda: labeled.labels("200").inc()),
+        ("cached child.inc()", lambda: child.inc()),
+        ("histogram.observe()", lambda: histogram.observe(0.003)),
+        ("with histogram.time()", lambda: histogram.time().__enter__().__exit__(None, None, None)),
+        ("empty call (baseline)", lambda: None),
+        ("per-tweet instrumentation", per_tweet),
+    ]
+    for name, function in cases:
+        best = min(timeit.repeat(function, number=args.iterations, repeat=3)) / args.iterations
+        print("{0:<28} {1:8.3f}us".format(name, best * 1e6))
+    per_tweet_cost = min(timeit.repeat(per_tweet, number=args.iterations, repeat=3)) / args.iterations
+    print("Instrumentation alone would saturate one core at {0:,.0f} tweets/s".format(1 / per_tweet_cost))
+    print("At 1000 tweets/s it takes {0:.3%} of one core".format(per_tweet_cost * 1000))
+
+
+if __name__ == '__main__':
+    main()
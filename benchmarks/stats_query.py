@@ -0,0 +1,107 @@
+"""
+Compare stats query with users JOIN (old) and with weight stored in tweets.k.
+Creates temporary "stats_benchmark" schema in given database and drops it at end.
+    python3 benchmarks/stats_query.py "dbname=twitter user=postgres host=127.0.0.1" [--tweets 200000]
+"""
+import argparse
+import statistics
+import time
+import psycopg2
+
+
+SCHEMA = "stats_benchmark"
+
+JOIN_QUERY = """
+SELECT SUM(subQuery.positive * subQuery.k), SUM(subQuery.negative * subQuery.k), SUM(subQuery.neutral * subQuery.k)
+  FROM (
+    SELECT
+      CASE WHEN tweet_texts.classification = 'positive' THEN 1 ELSE 0 END positive,
+      CASE WHEN tweet_texts.classification = 'negative' THEN 1 ELSE 0 END negative,
+      CASE WHEN tweet_texts.classification = 'neutral' THEN 1 ELSE 0 END neutral,
+      CASE WHEN users.k IS NOT NULL THEN users.k ELSE 1.0 END k
+    FROM tweets
+    INNER JOIN tweet_texts ON tweets.text = tweet_texts.id
+    INNER JOIN tweets_stocks ON tweets.id = tweets_stocks.tweet
+    LEFT JOIN users ON tweets.uid = users.id
+    WHERE tweets.time >= %s AND tweets.time <= %s AND tweets_stocks.stock = %s
+  ) subQuery
+"""
+
+STORED_WEIGHT_QUERY = """
+SELECT
+    SUM(CASE WHEN tweet_texts.classification = 'positive' THEN tweets.k ELSE 0 END),
+    SUM(CASE WHEN tweet_texts.classification = 'negative' THEN tweets.k ELSE 0 END),
+    SUM(CASE WHEN tweet_texts.classification = 'neutral' THEN tweets.k ELSE 0 END)
+  FROM tweets
+  INNER JOIN tweet_texts ON tweets.text = tweet_texts.id
+  INNER JOIN tweets_stocks ON tweets.id = tweets_stocks.tweet
+  WHERE tweets.time >= %s AND tweets.time <= %s AND tweets_stocks.stock = %s
+"""
+
+
+def fill(cur, tweets, users, texts):
+    cur.execute("CREATE TABLE tweet_texts (id SERIAL PRIMARY KEY, text TEXT, classification VARCHAR(20))")
+    cur.execute("CREATE TABLE users (id bigint PRIMARY KEY, name VARCHAR(256), k DOUBLE PRECISION)")
+    cur.execute("CREATE TABLE tweets (id SERIAL PRIMARY KEY, uid bigint, text INTEGER, time TIMESTAMP, "
+                "k DOUBLE PRECISION NOT NULL DEFAULT 1.0)")
+    cur.execute("CREATE TABLE tweets_stocks (stock INTEGER, tweet INTEGER)")
+    cur.execute("INSERT INTO tweet_texts (text, classification) "
+                "SELECT 'text ' || i, (ARRAY['positive', 'negative', 'neutral'])[1 + i % 3] "
+                "FROM generate_series(1, %s) i", [texts])
+    cur.execute("INSERT INTO users (id, name, k) "
+                "SELECT i, 'user' || i, 0.5 + random() FROM generate_series(1, %s) i", [users])
+    cur.execute("INSERT INTO tweets (uid, text, time) "
+                "SELECT 1 + (random() * %s * 2)::bigint, 1 + (random() * (%s - 1))::int, "
+                "  now() - random() * interval '30 days' "
+                "FROM generate_series(1, %s)", [users, texts, tweets])
+    cur.execute("UPDATE tweets SET k = users.k FROM users WHERE tweets.uid = users.id")
+    cur.execute("INSERT INTO tweets_stocks (stock, tweet) SELECT 1 + id % 5, id FROM tweets")
+    cur.execute("CREATE INDEX ON tweets (time)")
+    cur.execute("CREATE INDEX ON tweets_stocks (tweet)")
+    cur.execute("CREATE INDEX ON tweets_stocks (stock)")
+    cur.execute("ANALYZE")
+
+
+def measure(cur, sql, params, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cur.execute(sql, params)
+        result = cur.fetchone()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stats query with and without users JOIN")
+    parser.add_argument("dsn", help="psycopg2 connection string")
+    parser.add_argument("--tweets", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=5000, help="users with weights (half of tweet authors)")
+    parser.add_argument("--texts", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("DROP SCHEMA IF EXISTS {0} CASCADE".format(SCHEMA))
+    cur.execute("CREATE SCHEMA {0}".format(SCHEMA))
+    try:
+        cur.execute("SET search_path TO {0}".format(SCHEMA))
+        fill(cur, args.tweets, args.users, args.texts)
+        for days in [1, 7, 30]:
+            params = [time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() - days * 86400)),
+                      time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()), 1]
+            join_time, join_result = measure(cur, JOIN_QUERY, params, args.repeat)
+            stored_time, stored_result = measure(cur, STORED_WEIGHT_QUERY, params, args.repeat)
+            assert all(abs(a - b) < 1e-6 * max(1.0, abs(a)) for a, b in zip(join_result, stored_result))
+            print("{0:>2} days: users JOIN {1:8.2f}ms, tweets.k {2:8.2f}ms ({3:.2f}x)".format(
+                days, join_time * 1000, stored_time * 1000, join_time / stored_time))
+    finally:
+        cur.execute("DROP SCHEMA IF EXISTS {0} CASCADE".format(SCHEMA))
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -10,17 +10,20 @@ CREATE TABLE tweet_texts
 (
     id SERIAL PRIMARY KEY NOT NULL,
     text TEXT,
+    hash bigint NOT NULL,
     classification VARCHAR(20)
 );
-CREATE UNIQUE INDEX tweet_texts_text_uindex ON tweet_texts (text);
+CREATE UNIQUE INDEX tweet_texts_hash_uindex ON tweet_texts (hash);
 CREATE TABLE tweets
 (
     id SERIAL PRIMARY KEY NOT NULL,
     uid bigint,
     text INTEGER,
     time TIMESTAMP,
+    k DOUBLE PRECISION NOT NULL DEFAULT 1.0,
     CONSTRAINT tweets_tweet_texts_id_fk FOREIGN KEY (text) REFERENCES tweet_texts (id)
 );
+CREATE INDEX tweets_uid_index ON tweets (uid);
 CREATE TABLE tweets_stocks
 (
     stock INTEGER,
@@ -34,6 +37,19 @@ CREATE TABLE users
     name VARCHAR(256),
     k DOUBLE PRECISION
 );
+CREATE FUNCTION users_changed() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE tweets SET k = 1.0 WHERE uid = OLD.id AND k <> 1.0;
+    ELSE
+        UPDATE tweets SET k = COALESCE(NEW.k, 1.0) WHERE uid = NEW.id AND k <> COALESCE(NEW.k, 1.0);
+    END IF;
+    PERFORM pg_notify('users_changed', '{}');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER users_changed_trigger AFTER INSERT OR UPDATE OR DELETE ON users
+    FOR EACH ROW EXECUTE PROCEDURE users_changed();
 CREATE TABLE whitelist_hashtags
 (
     tag VARCHAR(256) PRIMARY KEY NOT NULL
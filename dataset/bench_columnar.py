@@ -0,0 +1,76 @@
+"""
+Compare time and memory of CSV and columnar dataset loading/splitting.
+    python3 bench_columnar.py [ds.csv] [--repeat 5]
+Memory is python heap peak (tracemalloc) - mmap'ed file pages are not counted there.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import columnar
+import data
+
+
+def cls_to_text(cls):
+    if int(cls) == 0:
+        return "neutral"
+    elif int(cls) > 0:
+        return "positive"
+    else:
+        return "negative"
+
+
+def csv_path(source):
+    # Same operations as split.py used before columnar format
+    rows = list(map(lambda row: [row[1], cls_to_text(row[2])],
+                    data.read(source)))
+    parts = {}
+    for label in ["positive", "negative", "neutral"]:
+        subset = list(filter(lambda row: row[1] == label, rows))
+        to = int(len(subset) * 0.7)
+        parts[label] = (subset[:to], subset[to:])
+    return parts
+
+
+def columnar_path(target):
+    with columnar.load(target) as dataset:
+        parts = {}
+        for label, train, test in columnar.stratified_splits(dataset, 0.7, seed=0):
+            parts[label] = (train, test)
+        return parts
+
+
+def measure(function, argument, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    function(argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark columnar dataset format")
+    parser.add_argument("source", nargs="?", default="ds.csv")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    handle, target = tempfile.mkstemp(suffix=".col")
+    os.close(handle)
+    try:
+        started = time.perf_counter()
+        rows = columnar.convert(args.source, target, text_column=1, label_column=2, label_mapper=cls_to_text)
+        convert_time = time.perf_counter() - started
+        print("{0} rows; CSV {1} bytes, columnar {2} bytes (converted in {3:.3f}s)".format(
+            rows, os.path.getsize(args.source), os.path.getsize(target), convert_time))
+        for name, function, argument in [("csv", csv_path, args.source),
+                                         ("columnar", columnar_path, target)]:
+            best, peak = measure(function, argument, args.repeat)
+            print("{0:<10} load+split {1:8.2f}ms, peak heap {2:10.1f}KiB".format(name, best * 1000, peak / 1024))
+    finally:
+        os.remove(target)
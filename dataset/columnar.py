@@ -0,0 +1,216 @@
+"""
+Compact columnar dataset format.
+
+CSV is converted once into file with next sections (arrays in native byte order):
+- header - magic and section offsets
+- texts - utf-8 texts, concatenated
+- labels - label number of each row (uint8)
+- offsets - rows+1 text offsets (uint64), text i is texts[offsets[i]:offsets[i+1]]
+- label names - JSON list
+File is loaded through mmap, so rows are not copied into python objects until read,
+    and splits are arrays of row indices.
+"""
+import array
+import csv
+import json
+import mmap
+import os
+import random
+import struct
+import data
+
+
+MAGIC = b"TWCOL\x00\x00\x01"
+_HEADER = struct.Struct("=8sQQQQQ")
+_ALIGN = 8
+
+
+def _pad(target):
+    padding = (-target.tell()) % _ALIGN
+    target.write(b"\x00" * padding)
+
+
+def convert(source, target, text_column=0, label_column=1, label_mapper=None):
+    """
+    Convert CSV into columnar file
+    :param source: CSV path
+    :type source: str
+    :param target: columnar file path
+    :type target: str
+    :param text_column: text column number
+    :type text_column: int
+    :param label_column: label column number
+    :type label_column: int
+    :param label_mapper: optional function to convert label column value
+    :type label_mapper: (str) -> str
+    :return: rows count
+    :rtype: int
+    """
+    label_numbers = {}
+    labels = array.array("B")
+    offsets = array.array("Q", [0])
+    with open(source, "r", encoding="utf-8") as src, open(target, "wb") as dst:
+        dst.write(b"\x00" * _HEADER.size)
+        texts_offset = dst.tell()
+        for row in csv.reader(src):
+            label = row[label_column]
+            if label_mapper is not None:
+                label = label_mapper(label)
+            if label not in label_numbers:
+                assert len(label_numbers) < 256
+                label_numbers[label] = len(label_numbers)
+            text = row[text_column].encode("utf-8")
+            dst.write(text)
+            labels.append(label_numbers[label])
+            offsets.append(offsets[-1] + len(text))
+        _pad(dst)
+        labels_offset = dst.tell()
+        labels.tofile(dst)
+        _pad(dst)
+        offsets_offset = dst.tell()
+        offsets.tofile(dst)
+        names_offset = dst.tell()
+        names = sorted(label_numbers, key=lambda name: label_numbers[name])
+        dst.write(json.dumps(names).encode("utf-8"))
+        dst.seek(0)
+        dst.write(_HEADER.pack(MAGIC, len(labels), texts_offset, labels_offset, offsets_offset, names_offset))
+    return len(labels)
+
+
+class ColumnarDataset:
+    """
+    Memory-mapped columnar dataset
+    """
+
+    def __init__(self, path):
+        """
+        :param path: columnar file path
+        :type path: str
+        """
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        magic, rows, texts_offset, labels_offset, offsets_offset, names_offset = \
+            _HEADER.unpack_from(self._buffer)
+        assert magic == MAGIC, "{0} is not columnar dataset".format(path)
+        self.rows = rows
+        self._texts = self._buffer[texts_offset:labels_offset]
+        self.labels = self._buffer[labels_offset:labels_offset + rows]
+        self.offsets = self._buffer[offsets_offset:offsets_offset + (rows + 1) * 8].cast("Q")
+        self.label_names = json.loads(bytes(self._buffer[names_offset:]).decode("utf-8"))
+
+    def __len__(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._texts.release()
+        self.labels.release()
+        self.offsets.release()
+        self._buffer.release()
+        self._mmap.close()
+        self._file.close()
+
+    def text(self, index):
+        """
+        :param index: row number
+        :type index: int
+        :return: row text
+        :rtype: str
+        """
+        return bytes(self._texts[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+
+    def label(self, index):
+        """
+        :param index: row number
+        :type index: int
+        :return: row label
+        :rtype: str
+        """
+        return self.label_names[self.labels[index]]
+
+    def rows_of(self, indices):
+        """
+        Iterate text-label rows of given indices
+        :param indices: row numbers
+        :type indices: collections.Iterable[int]
+        :return: text-label rows
+        :rtype: collections.Iterable[list[str]]
+        """
+        for index in indices:
+            yield [self.text(index), self.label(index)]
+
+    def class_indices(self):
+        """
+        Row numbers of each label (in one pass over labels column)
+        :return: label-indices dict
+        :rtype: dict[str, array.array]
+        """
+        indices = [array.array("I") for _ in self.label_names]
+        for index, label in enumerate(self.labels):
+            indices[label].append(index)
+        return dict(zip(self.label_names, indices))
+
+
+def load(path):
+    """
+    Open columnar dataset
+    :param path: columnar file path
+    :type path: str
+    :rtype: ColumnarDataset
+    """
+    return ColumnarDataset(path)
+
+
+def load_or_convert(source, target, text_column=0, label_column=1, label_mapper=None):
+    """
+    Open columnar dataset, converting CSV if columnar file is missing or older
+    :rtype: ColumnarDataset
+    """
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source):
+        convert(source, target, text_column, label_column, label_mapper)
+    return load(target)
+
+
+def stratified_splits(dataset, splitter, seed=None):
+    """
+    Shuffle rows of each label and split them into train/test parts
+    :param dataset: dataset
+    :type dataset: ColumnarDataset
+    :param splitter: train part (in [0..1])
+    :type splitter: float
+    :param seed: random seed
+    :return: label, train indices, test indices (one tuple per label)
+    :rtype: collections.Iterable[(str, array.array, array.array)]
+    """
+    rnd = random.Random(seed)
+    for label, indices in dataset.class_indices().items():
+        rnd.shuffle(indices)
+        to = int(len(indices) * splitter)
+        yield label, indices[:to], indices[to:]
+
+
+def balanced(first, second):
+    """
+    Equal count of indices from both classes (like split.save_subset)
+    :type first: array.array
+    :type second: array.array
+    :rtype: array.array
+    """
+    to = min(len(first), len(second))
+    return first[:to] + second[:to]
+
+
+def write_subset(dataset, indices, path):
+    """
+    Write text-label rows of given indices into CSV
+    :type dataset: ColumnarDataset
+    :type indices: collections.Iterable[int]
+    :type path: str
+    """
+    data.write(path, dataset.rows_of(indices))
@@ -0,0 +1,203 @@
+"""
+Evaluate classifiers (or ensembles of them) on dataset CSVs.
+
+E.g. evaluate each pair classifier on its test subset:
+    python3 evaluate.py neg-pos-test.csv --classifier NEGATIVE_POSITIVE_ID --output neg-pos-test-watson.csv
+Or evaluate ensemble on all test subsets:
+    python3 evaluate.py neg-pos-test.csv neu-neg-test.csv neu-pos-test.csv \
+        --classifier ID1 --classifier ID2 --classifier ID3 --output test-full-watson.csv
+Predictions of each classifier are cached (by text hash) - so different ensemble rules
+    (see --min-votes) can be compared without new classifier calls.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+import data
+
+# run from dataset directory without installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from twitter_classifier.watson_nlc import AsyncNaturalLanguageClassifier, vote
+
+
+def read_test_data(paths):
+    """
+    Read text-class rows of given CSVs, skipping duplicated texts
+    :param paths: CSV paths
+    :type paths: list[str]
+    :return: unique rows
+    :rtype: list[list[str]]
+    """
+    unique_test = []
+    unique_texts = set()
+    for path in paths:
+        for row in data.read(path):
+            if row[0] not in unique_texts:
+                unique_texts.add(row[0])
+                unique_test.append(row)
+    return unique_test
+
+
+class PredictionCache:
+    """
+    Classifier answers stored in JSON file, keyed by hash of classifier id and text
+    """
+
+    def __init__(self, path):
+        """
+        :param path: cache file (None - not store cache)
+        :type path: str|None
+        """
+        self.path = path
+        self.predictions = {}
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as src:
+                self.predictions = json.load(src)
+
+    @staticmethod
+    def key(classifier_id, text):
+        return hashlib.sha1((classifier_id + "\0" + text).encode("utf-8")).hexdigest()
+
+    def get(self, classifier_id, text):
+        prediction = self.predictions.get(PredictionCache.key(classifier_id, text))
+        if prediction is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return prediction
+
+    def set(self, classifier_id, text, prediction):
+        self.predictions[PredictionCache.key(classifier_id, text)] = prediction
+
+    def save(self):
+        if self.path is None:
+            return
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as target:
+            json.dump(self.predictions, target)
+        os.replace(temporary_path, self.path)
+
+
+async def predict_all(nlc, classifier_ids, texts, cache, concurrency):
+    """
+    Get predictions of each classifier for each text
+    :param nlc: opened classifier client
+    :type nlc: AsyncNaturalLanguageClassifier
+    :param classifier_ids: classifier ids
+    :type classifier_ids: list[str]
+    :param texts: texts
+    :type texts: list[str]
+    :param cache: prediction cache
+    :type cache: PredictionCache
+    :param concurrency: max count of simultaneous requests
+    :type concurrency: int
+    :return: classes by text (in order of classifier ids)
+    :rtype: dict[str, list[str]]
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    done = [0]
+
+    async def _one(classifier_id, text):
+        async with semaphore:
+            top, _ = await nlc.classify(classifier_id, text)
+        cache.set(classifier_id, text, top)
+        done[0] += 1
+        if done[0] % 100 == 0:
+            print("{0}/{1} requests".format(done[0], len(requests)))
+
+    requests = []
+    for text in texts:
+        for classifier_id in classifier_ids:
+            if cache.get(classifier_id, text) is None:
+                requests.append((classifier_id, text))
+    try:
+        await asyncio.gather(*[_one(classifier_id, text) for classifier_id, text in requests])
+    finally:
+        cache.save()
+    return {text: [cache.predictions[PredictionCache.key(classifier_id, text)] for classifier_id in classifier_ids]
+            for text in texts}
+
+
+def confusion_matrix(rows, predictions):
+    """
+    Build confusion matrix
+    :param rows: text-class rows
+    :type rows: list[list[str]]
+    :param predictions: text-predicted class dict
+    :type predictions: dict[str, str]
+    :return: classes, matrix[right class][predicted class]
+    :rtype: (list[str], dict[str, dict[str, int]])
+    """
+    classes = sorted(set([row[1] for row in rows]) | set(predictions.values()))
+    matrix = {right: {predicted: 0 for predicted in classes} for right in classes}
+    for text, right_class in rows:
+        matrix[right_class][predictions[text]] += 1
+    return classes, matrix
+
+
+def report(rows, predictions, elapsed, cache):
+    classes, matrix = confusion_matrix(rows, predictions)
+    errors = sum(1 for text, right_class in rows if predictions[text] != right_class)
+    width = max([len(class_name) for class_name in classes] + [len("right\\pred")]) + 2
+    print("right\\pred".ljust(width) + "".join(class_name.rjust(width) for class_name in classes))
+    for right in classes:
+        print(right.ljust(width) + "".join(str(matrix[right][predicted]).rjust(width)
+                                          for predicted in classes))
+    print()
+    print("class".ljust(width) + "precision".rjust(width) + "recall".rjust(width))
+    for class_name in classes:
+        predicted_count = sum(matrix[right][class_name] for right in classes)
+        right_count = sum(matrix[class_name].values())
+        precision = matrix[class_name][class_name] / predicted_count if predicted_count else 0.0
+        recall = matrix[class_name][class_name] / right_count if right_count else 0.0
+        print(class_name.ljust(width) + "{0:.3f}".format(precision).rjust(width) +
+              "{0:.3f}".format(recall).rjust(width))
+    print()
+    print("Errors : {0} of {1} ({2:.1%})".format(errors, len(rows), errors / len(rows) if rows else 0.0))
+    print("Cache : {0} hits, {1} misses".format(cache.hits, cache.misses))
+    print("Throughput : {0:.1f} texts/s ({1:.2f}s total)".format(
+        len(rows) / elapsed if elapsed > 0 else 0.0, elapsed))
+
+
+async def evaluate(args):
+    rows = read_test_data(args.datasets)
+    texts = [row[0] for row in rows]
+    cache = PredictionCache(args.cache)
+    started = time.time()
+    with AsyncNaturalLanguageClassifier(args.username, args.password, args.base_url) as nlc:
+        classes = await predict_all(nlc, args.classifier, texts, cache, args.concurrency)
+    elapsed = time.time() - started
+    if len(args.classifier) == 1:
+        predictions = {text: classes[text][0] for text in texts}
+    else:
+        predictions = {text: vote(classes[text], args.default_class, args.min_votes) for text in texts}
+    if args.output is not None:
+        data.write(args.output, [[text, predictions[text]] for text in texts])
+    report(rows, predictions, elapsed, cache)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluate classifiers on dataset CSVs")
+    parser.add_argument("datasets", nargs="+", help="CSVs with text,class rows")
+    parser.add_argument("--classifier", action="append", required=True,
+                        help="classifier id (repeat for ensemble)")
+    parser.add_argument("--base-url", default=AsyncNaturalLanguageClassifier.DEFAULT_BASE_URL,
+                        help="NLC service url (e.g. local stub)")
+    parser.add_argument("--username", default="username")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--concurrency", type=int, default=20,
+                        help="max count of simultaneous requests")
+    parser.add_argument("--cache", default="predictions-cache.json",
+                        help="prediction cache file")
+    parser.add_argument("--min-votes", type=int, default=2,
+                        help="ensemble: min votes of top class")
+    parser.add_argument("--default-class", default="neutral",
+                        help="ensemble: class if top class haven't enough votes")
+    parser.add_argument("--output", default=None,
+                        help="CSV to write text,predicted class rows")
+    asyncio.get_event_loop().run_until_complete(evaluate(parser.parse_args()))
@@ -0,0 +1,17 @@
+-- Store users.k copy in tweets (so stats don't join users table)
+ALTER TABLE tweets ADD COLUMN k DOUBLE PRECISION NOT NULL DEFAULT 1.0;
+UPDATE tweets SET k = users.k FROM users WHERE tweets.uid = users.id AND users.k IS NOT NULL;
+CREATE INDEX tweets_uid_index ON tweets (uid);
+CREATE FUNCTION users_changed() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE tweets SET k = 1.0 WHERE uid = OLD.id AND k <> 1.0;
+    ELSE
+        UPDATE tweets SET k = COALESCE(NEW.k, 1.0) WHERE uid = NEW.id AND k <> COALESCE(NEW.k, 1.0);
+    END IF;
+    PERFORM pg_notify('users_changed', '{}');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER users_changed_trigger AFTER INSERT OR UPDATE OR DELETE ON users
+    FOR EACH ROW EXECUTE PROCEDURE users_changed();
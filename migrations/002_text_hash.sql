@@ -0,0 +1,15 @@
+-- Deduplicate texts by 64-bit hash of normalized text (see fingerprint.text_hash) instead of full text
+ALTER TABLE tweet_texts ADD COLUMN hash bigint;
+UPDATE tweet_texts
+    SET hash = ('x' || substr(md5(lower(btrim(regexp_replace(text, '\s+', ' ', 'g')))), 1, 16))::bit(64)::bigint;
+-- Texts which differ only by case or spaces become one text
+CREATE TEMPORARY TABLE tweet_texts_duplicates AS
+    SELECT id, MIN(id) OVER (PARTITION BY hash) AS keep FROM tweet_texts;
+DELETE FROM tweet_texts_duplicates WHERE id = keep;
+UPDATE tweets SET text = tweet_texts_duplicates.keep
+    FROM tweet_texts_duplicates WHERE tweets.text = tweet_texts_duplicates.id;
+DELETE FROM tweet_texts USING tweet_texts_duplicates WHERE tweet_texts.id = tweet_texts_duplicates.id;
+DROP TABLE tweet_texts_duplicates;
+ALTER TABLE tweet_texts ALTER COLUMN hash SET NOT NULL;
+DROP INDEX tweet_texts_text_uindex;
+CREATE UNIQUE INDEX tweet_texts_hash_uindex ON tweet_texts (hash);
@@ -17,10 +17,20 @@ setup(
         'aiohttp',
         'tornado'
     ],
+    extras_require={
+        'fast_json': ['orjson']
+    },
     package_data={
         'twitter_classifier': ['config.json']
     },
     entry_points={
-        'console_scripts': 'twitter_classifier_server=twitter_classifier:server_main'
+        'console_scripts': [
+            'twitter_classifier_server=twitter_classifier:server_main',
+            'twitter_classifier_api=twitter_classifier:api_main',
+            'twitter_classifier_stream=twitter_classifier:stream_main',
+            'twitter_classifier_backfill=twitter_classifier:backfill_main',
+            'twitter_classifier_stub_nlc=twitter_classifier:stub_nlc_main',
+            'twitter_classifier_loadgen=twitter_classifier:loadgen_main'
+        ]
     }
 )
\ No newline at end of file
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import tempfile
+import types
+import unittest
+from unittest import mock
+from twitter_classifier import backfill
+from twitter_classifier.window import RELOAD_CHANNEL
+from twitter_classifier.watson_nlc import AsyncNaturalLanguageClassifier, WatsonException
+
+
+class _FailingClassifier(AsyncNaturalLanguageClassifier):
+    def __init__(self):
+        super().__init__("username", "password")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def classify(self, classifier_id, text):
+        raise WatsonException(503, "Service unavailable")
+
+
+class _PositiveClassifier(_FailingClassifier):
+    async def classify(self, classifier_id, text):
+        return "positive", {"positive": 0.9}
+
+
+class BackfillTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.checkpoint = backfill.Checkpoint(os.path.join(self.directory.name, "checkpoint.json"))
+        configuration = types.SimpleNamespace(nlc=types.SimpleNamespace(
+            classifiers=["first", "second", "third"], text_per_block=10))
+        self.logic = types.SimpleNamespace(configuration=configuration, nlc=_FailingClassifier)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_ensemble_classify_propagates_failures(self):
+        with _FailingClassifier() as nlc:
+            with self.assertRaises(WatsonException):
+                asyncio.run(nlc.ensemble_classify(["first", "second"], "text", "neutral"))
+
+    def test_classifier_outage_keeps_classifications_and_checkpoint(self):
+        pages = [[(1, "first text"), (2, "second text")], []]
+        updates = []
+
+        async def _texts_page(after_id, limit, only_unclassified=False):
+            return pages.pop(0)
+
+        async def _update_classification(classifications):
+            updates.append(classifications)
+
+        job = backfill.Backfill(self.logic, self.checkpoint, 100, None, False)
+        with mock.patch.object(backfill, "texts_page", _texts_page), \
+                mock.patch.object(backfill, "update_classification", _update_classification):
+            finished = asyncio.run(job.run())
+        self.assertFalse(finished)
+        self.assertEqual(job.failed, 2)
+        self.assertEqual(job.processed, 0)
+        self.assertTrue(all(len(classifications) == 0 for classifications in updates))
+        self.assertEqual(self.checkpoint.load(), 0)
+
+    def test_reclassification_reloads_sentiment_window(self):
+        pages = [[(1, "first text"), (2, "second text")], []]
+        updates = []
+        notifications = []
+
+        async def _texts_page(after_id, limit, only_unclassified=False):
+            return pages.pop(0)
+
+        async def _update_classification(classifications):
+            updates.append(classifications)
+
+        async def _notify(channel, payloads):
+            notifications.append((channel, len(updates)))
+
+        self.logic.nlc = _PositiveClassifier
+        job = backfill.Backfill(self.logic, self.checkpoint, 100, None, False)
+        with mock.patch.object(backfill, "texts_page", _texts_page), \
+                mock.patch.object(backfill, "update_classification", _update_classification), \
+                mock.patch.object(backfill, "notify", _notify):
+            finished = asyncio.run(job.run())
+        self.assertTrue(finished)
+        self.assertEqual(updates, [{1: "positive", 2: "positive"}])
+        self.assertEqual(notifications, [(RELOAD_CHANNEL, 1)])
+        self.assertEqual(self.checkpoint.load(), 2)
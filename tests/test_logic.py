@@ -0,0 +1,85 @@
+import asyncio
+import datetime
+import time
+import unittest
+from unittest import mock
+from twitter_classifier import logic
+from twitter_classifier.live import LiveHub, SENTIMENT_CHANNEL
+from twitter_classifier.window import RELOAD_CHANNEL
+from tests.test_window import _Rows
+
+
+CONFIGURATION = {
+    "twitter": {"consumer_key": "key", "consumer_secret": "secret", "access_token": "token",
+                "access_token_secret": "token secret", "user_filter_per_request": 10},
+    "nlc": {"username": "username", "password": "password", "classifiers": ["first"], "text_per_block": 10},
+    "db": "dbname=twitter",
+    "port": 8000,
+    "log_level": 10,
+    "follow_stocks": ["TWTR"]
+}
+
+
+class FollowSentimentTest(unittest.TestCase):
+    def setUp(self):
+        self.second = int(time.time()) - 10
+        self.rows = [(1, self.second, "positive", 1.0, 10)]
+        self.listeners = {}
+
+    async def _listen(self, channel, callback, on_listen=None, retry_timeout=5):
+        self.listeners[channel] = callback
+        if on_listen is not None:
+            on_listen()
+        await asyncio.Event().wait()
+
+    def _recent_sentiment(self, from_time, fetch_size=None):
+        return _Rows(self.rows)
+
+    def _stats(self, app_logic):
+        return app_logic.window.stats(1, datetime.datetime.utcfromtimestamp(self.second - 5),
+                                      datetime.datetime.utcfromtimestamp(self.second + 5))
+
+    def test_reload_notification_picks_up_changed_sums(self):
+        async def _run():
+            app_logic = logic.AppLogic(logic.Configuration(CONFIGURATION))
+            app_logic.WINDOW_RELOAD_DELAY = 0
+            task = asyncio.ensure_future(app_logic.follow_sentiment(LiveHub()))
+            await asyncio.sleep(0.01)
+            loaded = self._stats(app_logic)
+            # backfill reclassified text and added tweet weight
+            self.rows = [(1, self.second, "negative", 1.0, 10), (1, self.second, "positive", 2.0, 11)]
+            self.listeners[RELOAD_CHANNEL]({})
+            self.assertIsNone(self._stats(app_logic))
+            await asyncio.sleep(0.01)
+            reloaded = self._stats(app_logic)
+            task.cancel()
+            return loaded, reloaded
+
+        with mock.patch.object(logic, "listen", self._listen), \
+                mock.patch.object(logic, "recent_sentiment", self._recent_sentiment):
+            loaded, reloaded = asyncio.run(_run())
+        self.assertIn(SENTIMENT_CHANNEL, self.listeners)
+        self.assertEqual(loaded, (1.0, 0.0, 0.0))
+        self.assertEqual(reloaded, (2.0, 1.0, 0.0))
+
+
+class StockIdsTest(unittest.TestCase):
+    def test_known_stocks_are_found_without_query(self):
+        queries = []
+
+        async def _stock_ids():
+            return {"TWTR": 1}
+
+        async def _stock_by_filter(stock_filter):
+            queries.append(stock_filter)
+            return 2
+
+        async def _run():
+            app_logic = logic.AppLogic(logic.Configuration(CONFIGURATION))
+            await app_logic.load_stock_ids()
+            return [await app_logic.stock_by_filter(stock_filter) for stock_filter in ["TWTR", "AAPL", "AAPL"]]
+
+        with mock.patch.object(logic, "stock_ids", _stock_ids), \
+                mock.patch.object(logic, "stock_by_filter", _stock_by_filter):
+            self.assertEqual(asyncio.run(_run()), [1, 2, 2])
+        self.assertEqual(queries, ["AAPL"])
@@ -0,0 +1,37 @@
+import json
+import unittest
+from unittest import mock
+from twitter_classifier import serialization
+
+
+class SerializationTest(unittest.TestCase):
+    def tearDown(self):
+        serialization.use()
+
+    def test_backends_are_compatible(self):
+        value = {"success": True, "response": {"positive": 0.5, "text": "caf\u00e9 \"quoted\"", "ids": [1, 2]}}
+        for name in serialization.available():
+            serialization.use(name)
+            self.assertEqual(json.loads(serialization.dumps(value).decode("utf-8")), value, name)
+
+    def test_default_backend_imports_only_first_installed(self):
+        imported = []
+
+        def _first():
+            imported.append("first")
+            raise ImportError()
+
+        def _second():
+            imported.append("second")
+            return lambda value: b"null"
+
+        def _third():
+            imported.append("third")
+            return lambda value: b"null"
+
+        backends = {"first": _first, "second": _second, "third": _third}
+        with mock.patch.object(serialization, "BACKENDS", backends), \
+                mock.patch.object(serialization, "PREFERENCE", ["first", "second", "third"]):
+            serialization.use()
+            self.assertEqual(serialization.backend, "second")
+        self.assertEqual(imported, ["first", "second"])
@@ -0,0 +1,65 @@
+import asyncio
+import datetime
+import json
+from tornado.simple_httpclient import HTTPStreamClosedError
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import Application
+from twitter_classifier.server import ExportRequestHandler
+
+
+class _Rows:
+    """
+    Stand-in of db._ServerCursor, optionally failing after all rows
+    """
+
+    def __init__(self, count, error=None):
+        self.count = count
+        self.error = error
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for number in range(self.count):
+            yield number, datetime.datetime(2017, 3, 6), 12345, "text {0}".format(number), "positive"
+        if self.error is not None:
+            raise self.error
+
+
+class _ExportHandler(ExportRequestHandler):
+    async def _rows(self):
+        fail = self.get_argument("fail", None) is not None
+        return _Rows(3, RuntimeError("connection lost") if fail else None)
+
+
+class ExportRequestHandlerTest(AsyncHTTPTestCase):
+    def get_app(self):
+        self.exports = asyncio.Semaphore(1)
+        return Application([
+            (r'/export', _ExportHandler, {"exports": self.exports})
+        ])
+
+    def test_export(self):
+        response = self.fetch("/export")
+        self.assertEqual(response.code, 200)
+        rows = [json.loads(line) for line in response.body.decode("utf-8").splitlines()]
+        self.assertEqual([row["id"] for row in rows], [0, 1, 2])
+
+    def test_error_after_first_row_aborts_connection(self):
+        with self.assertRaises(HTTPStreamClosedError):
+            self.fetch("/export?fail=1")
+
+    def test_concurrent_exports_are_limited(self):
+        self.io_loop.run_sync(self.exports.acquire)
+        try:
+            response = self.fetch("/export")
+        finally:
+            self.exports.release()
+        self.assertEqual(response.code, 503)
+        self.assertEqual(json.loads(response.body.decode("utf-8")), {"success": False})
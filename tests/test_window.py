@@ -0,0 +1,79 @@
+import asyncio
+import datetime
+import time
+import unittest
+from twitter_classifier.window import SentimentWindow
+
+
+class _Rows:
+    """
+    Stand-in of db._ServerCursor which can pause after given count of rows
+    """
+
+    def __init__(self, rows, pause_after=None):
+        self.rows = list(rows)
+        self.pause_after = pause_after
+        self.paused = asyncio.Event()
+        self.resume = asyncio.Event()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for number, row in enumerate(self.rows):
+            if number == self.pause_after:
+                self.paused.set()
+                await self.resume.wait()
+            yield row
+
+
+class SentimentWindowTest(unittest.TestCase):
+    def setUp(self):
+        self.second = int(time.time()) - 10
+        self.rows = [
+            (1, self.second, "positive", 2.0, 10),
+            (1, self.second, "negative", 1.0, 11)
+        ]
+
+    def _stats(self, window):
+        return window.stats(1, datetime.datetime.utcfromtimestamp(self.second - 5),
+                            datetime.datetime.utcfromtimestamp(self.second + 5))
+
+    def test_hydrate(self):
+        window = SentimentWindow(3600)
+        window.reset()
+        asyncio.run(window.hydrate(_Rows(self.rows)))
+        self.assertEqual(self._stats(window), (2.0, 1.0, 0.0))
+
+    def test_reset_during_hydration(self):
+        async def _run():
+            window = SentimentWindow(3600)
+            window.reset()
+            first_rows = _Rows(self.rows, pause_after=1)
+            first = asyncio.ensure_future(window.hydrate(first_rows))
+            await first_rows.paused.wait()
+            window.reset()
+            second = asyncio.ensure_future(window.hydrate(_Rows(self.rows)))
+            await second
+            first_rows.resume.set()
+            self.assertFalse(await first)
+            self.assertTrue(await second)
+            return window
+
+        self.assertEqual(self._stats(asyncio.run(_run())), (2.0, 1.0, 0.0))
+
+    def test_buffered_events(self):
+        window = SentimentWindow(3600)
+        window.reset()
+        window.publish({"stock_id": 1, "stock": "TWTR", "tweet_id": 11, "classification": "negative",
+                        "k": 1.0, "time": self.second})
+        window.publish({"stock_id": 1, "stock": "TWTR", "tweet_id": 12, "classification": "neutral",
+                        "k": 3.0, "time": self.second})
+        asyncio.run(window.hydrate(_Rows(self.rows)))
+        self.assertEqual(self._stats(window), (2.0, 1.0, 3.0))
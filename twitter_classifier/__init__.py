@@ -1,5 +1,32 @@
-from .server import main as _server_main
+# Entry points import their modules only when called,
+# so every process loads only dependencies it uses
 
 
 def server_main():
-    _server_main()
\ No newline at end of file
+    from .server import main
+    main()
+
+
+def api_main():
+    from .server import api_main
+    api_main()
+
+
+def stream_main():
+    from .server import stream_main
+    stream_main()
+
+
+def backfill_main():
+    from .backfill import main
+    main()
+
+
+def stub_nlc_main():
+    from .stub_nlc import main
+    main()
+
+
+def loadgen_main():
+    from .loadgen import main
+    main()
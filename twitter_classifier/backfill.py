@@ -0,0 +1,205 @@
+"""
+Bulk reclassification of stored tweet texts.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from . import log
+from .db import texts_page, update_classification, notify
+from .logic import Configuration, AppLogic
+from .window import RELOAD_CHANNEL
+
+
+class Checkpoint:
+    """
+    Last processed text id, stored in JSON file (so backfill can be resumed)
+    """
+
+    def __init__(self, path):
+        """
+        :param path: checkpoint file path (None - not store checkpoint)
+        :type path: str|None
+        """
+        self.path = path
+
+    def load(self):
+        """
+        Load last processed id
+        :return: last processed id (0 if not found)
+        :rtype: int
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return 0
+        with open(self.path, "r") as src:
+            return json.load(src)["last_id"]
+
+    def save(self, last_id):
+        """
+        Store last processed id
+        :param last_id: last processed id
+        :type last_id: int
+        """
+        if self.path is None:
+            return
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as target:
+            json.dump({"last_id": last_id}, target)
+        os.replace(temporary_path, self.path)
+
+    def reset(self):
+        """
+        Remove checkpoint
+        """
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class RateLimiter:
+    """
+    Allow no more than given count of classifier calls per second
+    """
+
+    def __init__(self, rate):
+        """
+        :param rate: calls per second (None or 0 - unlimited)
+        :type rate: float|None
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_time = 0.0
+
+    async def acquire(self, calls=1):
+        """
+        Wait while given count of calls will be allowed
+        :param calls: calls count
+        :type calls: int
+        """
+        if self.interval == 0.0:
+            return
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        start = max(now, self._next_time)
+        self._next_time = start + self.interval * calls
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class Backfill:
+    """
+    Walk tweet_texts in id-ordered chunks and (re)classify it
+    """
+
+    def __init__(self, logic, checkpoint, chunk_size, rate, only_unclassified):
+        """
+        :param logic: initialized application logic
+        :type logic: AppLogic
+        :param checkpoint: checkpoint
+        :type checkpoint: Checkpoint
+        :param chunk_size: texts per chunk (per DB round-trip)
+        :type chunk_size: int
+        :param rate: classifier calls per second (None - unlimited)
+        :type rate: float|None
+        :param only_unclassified: skip already classified texts
+        :type only_unclassified: bool
+        """
+        assert chunk_size > 0
+        self.logic = logic
+        self.checkpoint = checkpoint
+        self.chunk_size = chunk_size
+        self.limiter = RateLimiter(rate)
+        self.only_unclassified = only_unclassified
+        self.processed = 0
+        self.failed = 0
+
+    async def _classify_block(self, nlc, rows):
+        classifiers = self.logic.configuration.nlc.classifiers
+
+        async def _one(text):
+            await self.limiter.acquire(len(classifiers))
+            return await nlc.ensemble_classify(classifiers, text, "neutral")
+
+        return await asyncio.gather(*[_one(text) for _, text in rows],
+                                    return_exceptions=True)
+
+    async def _classify_chunk(self, nlc, rows):
+        """
+        Classify chunk by parallel blocks of nlc.text_per_block texts
+        :return: text id - classification dict (only for successfully classified texts)
+        :rtype: dict[int, str]
+        """
+        block_size = self.logic.configuration.nlc.text_per_block
+        classifications = {}
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            results = await self._classify_block(nlc, block)
+            for (text_id, _), result in zip(block, results):
+                if isinstance(result, Exception):
+                    logging.error("Can't classify text {0}: {1}".format(text_id, result))
+                    self.failed += 1
+                else:
+                    classifications[text_id] = result
+        return classifications
+
+    async def run(self):
+        """
+        Run backfill
+        :return: is all texts classified successfully
+        :rtype: bool
+        """
+        last_id = self.checkpoint.load()
+        logging.info("Starting backfill after text id {0}".format(last_id))
+        started = time.time()
+        with self.logic.nlc() as nlc:
+            while True:
+                rows = await texts_page(last_id, self.chunk_size, self.only_unclassified)
+                if len(rows) == 0:
+                    break
+                classifications = await self._classify_chunk(nlc, rows)
+                await update_classification(classifications)
+                if len(classifications) != 0:
+                    # API process keeps recent sums in memory
+                    await notify(RELOAD_CHANNEL, [{}])
+                self.processed += len(classifications)
+                if self.failed != 0:
+                    logging.error("Stopped after {0} failures, checkpoint kept at text id {1}".format(
+                        self.failed, last_id))
+                    return False
+                last_id = rows[-1][0]
+                self.checkpoint.save(last_id)
+                elapsed = time.time() - started
+                logging.info("Classified {0} texts (last id {1}), {2:.1f} texts/s".format(
+                    self.processed, last_id, self.processed / elapsed if elapsed > 0 else 0.0))
+        logging.info("Backfill finished: {0} texts in {1:.1f}s".format(self.processed, time.time() - started))
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reclassify stored tweet texts")
+    parser.add_argument("config", nargs="?",
+                        default=os.path.join(os.path.dirname(__file__), "config.json"),
+                        help="configuration file")
+    parser.add_argument("--checkpoint", default="backfill.checkpoint.json",
+                        help="checkpoint file to resume from")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore existing checkpoint and start from first text")
+    parser.add_argument("--chunk-size", type=int, default=500,
+                        help="texts per DB chunk")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="max classifier calls per second")
+    parser.add_argument("--only-unclassified", action="store_true",
+                        help="skip already classified texts")
+    args = parser.parse_args()
+
+    config = Configuration.from_file(args.config)
+    log.setup(config.log_level, config.log_sampling)
+    logic = AppLogic(config)
+    checkpoint = Checkpoint(args.checkpoint)
+    if args.restart:
+        checkpoint.reset()
+    backfill = Backfill(logic, checkpoint, args.chunk_size, args.rate, args.only_unclassified)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(logic.initialize())
+    if not loop.run_until_complete(backfill.run()):
+        raise SystemExit(1)
@@ -1,19 +1,34 @@
 """
 Module that wraps database class
 """
+import asyncio
+import itertools
+import json
+import logging
+import time
 import aiopg
+from .fingerprint import text_hash
+from .metrics import DB_POOL_WAIT
 
 
 _pool = None
+_dsn = None
+_fetch_size = 1000
+_cursor_ids = itertools.count()
 
 
-async def connect(dsn):
+async def connect(dsn, fetch_size=1000):
     """
     Connect to Postgresql
     :param dsn: connection string
     :type dsn: str
+    :param fetch_size: rows per round-trip for server-side cursors
+    :type fetch_size: int
     """
-    global _pool
+    global _pool, _dsn, _fetch_size
+    assert fetch_size > 0
+    _fetch_size = fetch_size
+    _dsn = dsn
     _pool = await aiopg.create_pool(dsn)
 
 
@@ -24,7 +39,9 @@ async def _query(builder, result=None):
     assert _pool is not None
     if result is None:
         result = _nop
+    started = time.perf_counter()
     async with _pool.acquire() as conn:
+        DB_POOL_WAIT.observe(time.perf_counter() - started)
         async with conn.cursor() as cur:
             sql = await builder(cur)
             await cur.execute(sql)
@@ -35,6 +52,129 @@ async def _fetchall(cur):
     return await cur.fetchall()
 
 
+async def ping():
+    """
+    Check database connection
+    :return: is database answering?
+    :rtype: bool
+    """
+    async def _builder(cur):
+        return "SELECT 1"
+
+    return (await _query(_builder, _fetchall))[0][0] == 1
+
+
+class _ServerCursor:
+    """
+    Async iterator over rows of a server-side cursor.
+    Rows are fetched by blocks of fetch_size, so result set is never materialized.
+    (psycopg2 haven't named cursors in async mode - so cursor declared by SQL)
+    Usage:
+        async with _iterate(builder) as rows:
+            async for row in rows:
+                ...
+    """
+
+    def __init__(self, builder, fetch_size=None, timeout=None):
+        """
+        :param builder: async function that build SQL query with given cursor
+        :type builder: (aiopg.Cursor) -> str
+        :param fetch_size: rows per FETCH (module default if None)
+        :type fetch_size: int|None
+        :param timeout: max duration of each FETCH and of idle time between them (seconds, None - unlimited).
+            Postgresql closes connection of too slow reader, so it doesn't hold pooled connection forever
+        :type timeout: float|None
+        """
+        self.builder = builder
+        self.fetch_size = fetch_size if fetch_size is not None else _fetch_size
+        self.timeout = timeout
+        self.name = "_cursor_{0}".format(next(_cursor_ids))
+        self._conn = None
+        self._cur = None
+        self._rows = []
+        self._position = 0
+        self._exhausted = False
+
+    async def __aenter__(self):
+        assert _pool is not None
+        started = time.perf_counter()
+        self._conn = await _pool.acquire()
+        DB_POOL_WAIT.observe(time.perf_counter() - started)
+        try:
+            self._cur = await self._conn.cursor()
+            sql = await self.builder(self._cur)
+            await self._cur.execute("BEGIN")
+            if self.timeout is not None:
+                milliseconds = int(self.timeout * 1000)
+                await self._cur.execute("SET LOCAL statement_timeout = {0}".format(milliseconds))
+                await self._cur.execute("SET LOCAL idle_in_transaction_session_timeout = {0}".format(milliseconds))
+            await self._cur.execute("DECLARE {0} NO SCROLL CURSOR FOR {1}".format(self.name, sql))
+        except BaseException:
+            await self._release(False)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self._release(exc_type is None)
+
+    async def _release(self, commit):
+        try:
+            if self._cur is not None and not self._cur.closed:
+                if commit:
+                    await self._cur.execute("CLOSE {0}".format(self.name))
+                    await self._cur.execute("COMMIT")
+                else:
+                    await self._cur.execute("ROLLBACK")
+                self._cur.close()
+        finally:
+            self._cur = None
+            _pool.release(self._conn)
+            self._conn = None
+
+    async def fetch(self):
+        """
+        Fetch next block of rows
+        :return: rows (empty list if cursor exhausted)
+        :rtype: list[tuple]
+        """
+        assert self._cur is not None
+        if self._exhausted:
+            return []
+        await self._cur.execute("FETCH FORWARD {0} FROM {1}".format(self.fetch_size, self.name))
+        rows = await self._cur.fetchall()
+        if len(rows) < self.fetch_size:
+            self._exhausted = True
+        return rows
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._position >= len(self._rows):
+            self._rows = await self.fetch()
+            self._position = 0
+            if len(self._rows) == 0:
+                raise StopAsyncIteration
+        row = self._rows[self._position]
+        self._position += 1
+        return row
+
+
+def _iterate(builder, fetch_size=None, timeout=None):
+    """
+    Stream query results through server-side cursor
+    :param builder: async function that build SQL query with given cursor
+    :type builder: (aiopg.Cursor) -> str
+    :param fetch_size: rows per FETCH (module default if None)
+    :type fetch_size: int|None
+    :param timeout: max duration of each FETCH and of idle time between them (seconds, None - unlimited)
+    :type timeout: float|None
+    :return: async context manager / async iterator of rows
+    :rtype: _ServerCursor
+    """
+    return _ServerCursor(builder, fetch_size, timeout)
+
+
 async def stocks():
     """
     Get stocks
@@ -51,27 +191,42 @@ async def stocks():
     return result
 
 
+async def stock_ids():
+    """
+    Get ids of all stocks
+    :return: filter - stock id dict
+    :rtype: dict[str, int]
+    """
+    async def _builder(cur):
+        return "SELECT filter, id FROM stocks"
+
+    return dict(await _query(_builder, _fetchall))
+
+
 async def store_texts(texts):
     """
-    Store texts in DB
+    Store texts in DB (texts with same fingerprint.text_hash are stored once)
     :param texts: texts
     :type texts: list[str]
-    :return: text-to-text id dict
+    :return: text-to-text id dict (only for new texts)
     :rtype: dict[str, int]
     """
     async def _builder(cur):
         values = []
-        for text in texts:
-            values.append((await cur.mogrify("(%s, %s)", [text, ''])).decode("utf-8"))
-        sql = "INSERT INTO tweet_texts (text, classification) VALUES " + \
+        for text_hash_value, text in hashes.items():
+            values.append((await cur.mogrify("(%s, %s, %s)", [text, text_hash_value, ''])).decode("utf-8"))
+        sql = "INSERT INTO tweet_texts (text, hash, classification) VALUES " + \
               ",".join(values) + \
-              " ON CONFLICT DO NOTHING " + \
+              " ON CONFLICT (hash) DO NOTHING " + \
               " RETURNING id, text"
         return sql
 
     result = {}
     if len(texts) == 0:
         return {}
+    hashes = {}
+    for text in texts:
+        hashes.setdefault(text_hash(text), text)
     sql_answer = await _query(_builder, _fetchall)
     for text_id, text in sql_answer:
         result[text] = text_id
@@ -80,26 +235,26 @@ async def store_texts(texts):
 
 async def find_texts(texts):
     """
-    Finf text ids
+    Finf text ids (by fingerprint.text_hash)
     :param texts: texts
     :type texts: list[str]
     :return: ids
     :rtype: dict[str, int]
     """
     async def _builder(cur):
-        values = []
-        for text in texts:
-            values.append((await cur.mogrify("%s", [text])).decode("utf-8"))
-        sql = "SELECT id, text FROM tweet_texts " + \
-              " WHERE tweet_texts.text IN (" + ",".join(values) + ")"
-        return sql
+        return (await cur.mogrify("SELECT id, hash FROM tweet_texts WHERE hash = ANY(%s)",
+                                  [list(set(hashes.values()))])).decode("utf-8")
 
     result = {}
     if len(texts) == 0:
         return {}
-    sql_answer = await _query(_builder, _fetchall)
-    for text_id, text in sql_answer:
-        result[text] = text_id
+    hashes = {text: text_hash(text) for text in texts}
+    ids = {}
+    for text_id, text_hash_value in await _query(_builder, _fetchall):
+        ids[text_hash_value] = text_id
+    for text, text_hash_value in hashes.items():
+        if text_hash_value in ids:
+            result[text] = ids[text_hash_value]
     return result
 
 
@@ -113,13 +268,13 @@ async def get_new_texts(texts):
     async def _builder(cur):
         text_values = []
         for text in texts:
-            text_values.append((await cur.mogrify("(%s)", [text])).decode("utf-8"))
+            text_values.append((await cur.mogrify("(%s, %s::bigint)", [text, text_hash(text)])).decode("utf-8"))
         return "SELECT subquery.text FROM (" + \
                "SELECT * FROM (VALUES " + \
                ",".join(text_values) + \
-               ") AS t(text)" + \
+               ") AS t(text, hash)" + \
                ") AS subquery " + \
-               "LEFT JOIN tweet_texts ON tweet_texts.text = subquery.text " +\
+               "LEFT JOIN tweet_texts ON tweet_texts.hash = subquery.hash " +\
                "WHERE tweet_texts.id IS NULL"
     sql_answer = await _query(_builder, _fetchall)
     texts = list(map(lambda row: row[0],
@@ -128,50 +283,96 @@ async def get_new_texts(texts):
 
 async def store_tweets(tweets):
     """
-    Store tweets
+    Store tweets.
+    Tweet weight is copied from users.k in the same INSERT,
+        so it can't be older than users table (users_changed trigger updates tweets which are already stored)
     :param tweets: tweets
     :type tweets: list[(str, datetime.datetime, int)]
-    :return: text-to-text id dict, tweet ids
-    :rtype: (dict[str, int], list[int])
+    :return: text-to-text id dict, tweet ids, tweet weights (tweets.k)
+    :rtype: (dict[str, int], list[int], list[float])
     """
     async def _builder(cur):
         values = []
-        for text, time, uid in tweets:
-            values.append((await cur.mogrify("(%s, %s, %s)", [
-                uid, time, text_ids[text]
+        for text, tweet_time, uid in tweets:
+            values.append((await cur.mogrify("(%s::bigint, %s::timestamp, %s::integer)", [
+                uid, tweet_time, text_ids[text]
             ])).decode("utf-8"))
-        return "INSERT INTO tweets (uid, time, text) VALUES " + \
-               ",".join(values) + " RETURNING tweets.id"
+        return "INSERT INTO tweets (uid, time, text, k) " + \
+               " SELECT data.uid, data.time, data.text, " + \
+               "   COALESCE((SELECT users.k FROM users WHERE users.id = data.uid), 1.0) " + \
+               " FROM (VALUES " + ",".join(values) + ") AS data (uid, time, text) " + \
+               " RETURNING tweets.id, tweets.k"
 
     if len(tweets) == 0:
-        return {}, []
+        return {}, [], []
     texts = [tweet[0] for tweet in tweets]
     await store_texts(texts)
     text_ids = await find_texts(texts)
-    tweet_ids = [item[0] for item in await _query(_builder, _fetchall)]
-    return text_ids, tweet_ids
+    rows = await _query(_builder, _fetchall)
+    return text_ids, [row[0] for row in rows], [row[1] for row in rows]
 
 
 async def update_classification(classifications):
     """
-    Update classification of texts
+    Update classification of texts (with one set-based UPDATE)
     :param classifications: text id - classification dict
     :type classifications: dict[int, str]
     """
     async def _builder(cur):
-        subsqls = []
+        values = []
         for text_id, classification in classifications.items():
-            subsql = (await cur.mogrify(
-                "UPDATE tweet_texts SET classification = %s WHERE tweet_texts.id = %s",
-                [classification, text_id]
-            )).decode("utf-8")
-            subsqls.append(subsql)
-        return ";".join(subsqls)
+            values.append((await cur.mogrify("(%s, %s)", [text_id, classification])).decode("utf-8"))
+        return "UPDATE tweet_texts SET classification = data.classification " + \
+               " FROM (VALUES " + ",".join(values) + ") AS data (id, classification) " + \
+               " WHERE tweet_texts.id = data.id"
 
     if len(classifications) != 0:
         await _query(_builder)
 
 
+async def text_classifications(text_ids):
+    """
+    Get stored classifications of texts
+    :param text_ids: text ids
+    :type text_ids: list[int]
+    :return: text id - classification dict (only for classified texts)
+    :rtype: dict[int, str]
+    """
+    async def _builder(cur):
+        return (await cur.mogrify("SELECT id, classification FROM tweet_texts " +
+                                  " WHERE id = ANY(%s) AND classification <> ''",
+                                  [list(text_ids)])).decode("utf-8")
+
+    if len(text_ids) == 0:
+        return {}
+    result = {}
+    for text_id, classification in await _query(_builder, _fetchall):
+        result[text_id] = classification
+    return result
+
+
+async def texts_page(after_id, limit, only_unclassified=False):
+    """
+    Get next page of texts ordered by id (keyset pagination)
+    :param after_id: return only texts with bigger id
+    :type after_id: int
+    :param limit: max page size
+    :type limit: int
+    :param only_unclassified: skip already classified texts
+    :type only_unclassified: bool
+    :return: (id, text) pairs
+    :rtype: list[(int, str)]
+    """
+    async def _builder(cur):
+        sql = "SELECT id, text FROM tweet_texts WHERE id > %s "
+        if only_unclassified:
+            sql += " AND (classification IS NULL OR classification = '') "
+        sql += " ORDER BY id LIMIT %s"
+        return (await cur.mogrify(sql, [after_id, limit])).decode("utf-8")
+
+    return list(await _query(_builder, _fetchall))
+
+
 async def stock_by_filter(stock_filter):
     """
     Find stock by filter
@@ -228,33 +429,13 @@ async def stock_stats(stock_id, from_time, to_time):
     """
     async def _builder(cur):
         sql = "SELECT " + \
-              "    SUM(subQuery.positive * subQuery.k) positive, " + \
-              "    SUM(subQuery.negative * subQuery.k) negative, " + \
-              "    SUM(subQuery.neutral * subQuery.k)  neutral " + \
-              "  FROM ( " + \
-              "    SELECT " + \
-              "      CASE " + \
-              "        WHEN tweet_texts.classification = 'positive' THEN 1 " + \
-              "        ELSE 0 " + \
-              "      END positive, " + \
-              "      CASE " + \
-              "        WHEN tweet_texts.classification = 'negative' THEN 1 " + \
-              "        ELSE 0 " + \
-              "      END negative, " + \
-              "      CASE " + \
-              "        WHEN tweet_texts.classification = 'neutral' THEN 1 " + \
-              "        ELSE 0 " + \
-              "      END neutral, " + \
-              "      CASE " + \
-              "        WHEN users.k IS NOT NULL THEN users.k " + \
-              "        ELSE 1.0 " + \
-              "      END k " + \
-              "    FROM tweets " + \
-              "    INNER JOIN tweet_texts ON tweets.text = tweet_texts.id " + \
-              "    INNER JOIN tweets_stocks ON tweets.id = tweets_stocks.tweet " + \
-              "    LEFT JOIN users ON tweets.uid = users.id " + \
-              "    WHERE tweets.time >= %s AND tweets.time <= %s AND tweets_stocks.stock = %s " + \
-              "  ) subQuery "
+              "    SUM(CASE WHEN tweet_texts.classification = 'positive' THEN tweets.k ELSE 0 END) positive, " + \
+              "    SUM(CASE WHEN tweet_texts.classification = 'negative' THEN tweets.k ELSE 0 END) negative, " + \
+              "    SUM(CASE WHEN tweet_texts.classification = 'neutral' THEN tweets.k ELSE 0 END)  neutral " + \
+              "  FROM tweets " + \
+              "  INNER JOIN tweet_texts ON tweets.text = tweet_texts.id " + \
+              "  INNER JOIN tweets_stocks ON tweets.id = tweets_stocks.tweet " + \
+              "  WHERE tweets.time >= %s AND tweets.time <= %s AND tweets_stocks.stock = %s "
         sql_text = (await cur.mogrify(sql, [from_time, to_time, stock_id])).decode("utf-8")
         return sql_text
 
@@ -277,24 +458,135 @@ async def whitelist_hashtags():
     async def _builder(cur):
         return "SELECT tag FROM whitelist_hashtags"
 
-    return list(map(lambda row: row[0],
-                    await _query(_builder, _fetchall)))
+    tags = []
+    async with _iterate(_builder) as rows:
+        async for row in rows:
+            tags.append(row[0])
+    return tags
 
 
-async def from_users_filter():
+def recent_sentiment(from_time, fetch_size=None):
     """
-    Return user filter
-    :return: user filter (e.g. "(from:alex4321 OR from:ibm)")
-    :rtype: list[str]
+    Stream weighted classification sums of tweets by stock and second
+    :param from_time: not include older tweets
+    :type from_time: datetime.datetime
+    :param fetch_size: rows per FETCH (module default if None)
+    :type fetch_size: int|None
+    :return: async context manager / async iterator of
+        (stock id, unix second, classification, sum of k, max tweet id) rows
+    :rtype: _ServerCursor
     """
     async def _builder(cur):
-        return "SELECT name FROM users"
+        sql = "SELECT tweets_stocks.stock, " + \
+              "    EXTRACT(EPOCH FROM date_trunc('second', tweets.time))::bigint, " + \
+              "    tweet_texts.classification, " + \
+              "    SUM(tweets.k), " + \
+              "    MAX(tweets.id) " + \
+              "  FROM tweets " + \
+              "  INNER JOIN tweet_texts ON tweets.text = tweet_texts.id " + \
+              "  INNER JOIN tweets_stocks ON tweets.id = tweets_stocks.tweet " + \
+              "  WHERE tweets.time >= %s AND tweet_texts.classification <> '' " + \
+              "  GROUP BY 1, 2, 3"
+        return (await cur.mogrify(sql, [from_time])).decode("utf-8")
+
+    return _iterate(_builder, fetch_size)
+
+
+def stock_tweets(stock_id, from_time, to_time, fetch_size=None, timeout=None):
+    """
+    Stream classified tweets of stock
+    :param stock_id: stock id
+    :type stock_id: int
+    :param from_time: not include older tweets
+    :type from_time: datetime.datetime
+    :param to_time: not include newer tweets
+    :type to_time: datetime.datetime
+    :param fetch_size: rows per FETCH (module default if None)
+    :type fetch_size: int|None
+    :param timeout: max duration of each FETCH and of idle time between them (seconds, None - unlimited)
+    :type timeout: float|None
+    :return: async context manager / async iterator of
+        (tweet id, time, uid, text, classification) rows ordered by time
+    :rtype: _ServerCursor
+    """
+    async def _builder(cur):
+        sql = "SELECT tweets.id, tweets.time, tweets.uid, tweet_texts.text, tweet_texts.classification " + \
+              "  FROM tweets " + \
+              "  INNER JOIN tweet_texts ON tweets.text = tweet_texts.id " + \
+              "  INNER JOIN tweets_stocks ON tweets.id = tweets_stocks.tweet " + \
+              "  WHERE tweets.time >= %s AND tweets.time <= %s AND tweets_stocks.stock = %s " + \
+              "    AND tweet_texts.classification <> '' " + \
+              "  ORDER BY tweets.time, tweets.id"
+        return (await cur.mogrify(sql, [from_time, to_time, stock_id])).decode("utf-8")
 
-    users = list(map(lambda row: row[0],
-                     await _query(_builder, _fetchall)))
-    user_filters = map(lambda name: "from:{0}".format(name),
-                       users)
-    return list(user_filters)
+    return _iterate(_builder, fetch_size, timeout)
+
+
+async def row_counts():
+    """
+    Count rows of tweet tables
+    :return: table - rows count dict
+    :rtype: dict[str, int]
+    """
+    tables = ["tweets", "tweet_texts", "tweets_stocks"]
+
+    async def _builder(cur):
+        return "SELECT " + ", ".join("(SELECT COUNT(*) FROM {0})".format(table) for table in tables)
+
+    return dict(zip(tables, (await _query(_builder, _fetchall))[0]))
+
+
+async def notify(channel, payloads):
+    """
+    Send notifications (see listen)
+    :param channel: channel name
+    :type channel: str
+    :param payloads: JSON-serializable payloads
+    :type payloads: list
+    """
+    async def _builder(cur):
+        values = []
+        for payload in payloads:
+            values.append((await cur.mogrify("(%s)", [json.dumps(payload)])).decode("utf-8"))
+        return (await cur.mogrify("SELECT pg_notify(%s, data.payload) FROM (VALUES " + ",".join(values) +
+                                  ") AS data (payload)", [channel])).decode("utf-8")
+
+    if len(payloads) != 0:
+        await _query(_builder)
+
+
+async def listen(channel, callback, on_listen=None, retry_timeout=5):
+    """
+    Receive notifications of channel forever (on separate connection, reconnecting after errors)
+    :param channel: channel name
+    :type channel: str
+    :param callback: function called with decoded payload of each notification
+    :type callback: (object) -> None
+    :param on_listen: optional function called after each (re)connection
+        (notifications sent before it may be lost)
+    :type on_listen: () -> None
+    :param retry_timeout: delay before reconnection (seconds)
+    :type retry_timeout: float
+    """
+    assert _dsn is not None
+    while True:
+        try:
+            async with aiopg.connect(_dsn) as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("LISTEN {0}".format(channel))
+                if on_listen is not None:
+                    on_listen()
+                while True:
+                    message = await conn.notifies.get()
+                    try:
+                        callback(json.loads(message.payload))
+                    except Exception:
+                        logging.exception("Can't process {0} notification {1}".format(channel, message.payload))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception("Listening of {0} failed, reconnecting".format(channel))
+            await asyncio.sleep(retry_timeout)
 
 
 async def all_classified_previously(tweets):
@@ -307,16 +599,15 @@ async def all_classified_previously(tweets):
     """
     async def _builder(cur):
         texts_mogrified = []
-        for text in unqiue_texts:
-            texts_mogrified.append((await cur.mogrify("(%s)", [text])).decode("utf-8"))
+        for text_hash_value in unqiue_hashes:
+            texts_mogrified.append((await cur.mogrify("(%s::bigint)", [text_hash_value])).decode("utf-8"))
         sql = "SELECT COUNT(*)=0" + \
-              " FROM ( VALUES " + ",".join(texts_mogrified) + " ) AS data (text) " + \
-              " LEFT JOIN tweet_texts ON tweet_texts.text = data.text" + \
-              " WHERE tweet_texts.text IS NULL"
+              " FROM ( VALUES " + ",".join(texts_mogrified) + " ) AS data (hash) " + \
+              " LEFT JOIN tweet_texts ON tweet_texts.hash = data.hash" + \
+              " WHERE tweet_texts.id IS NULL"
         return sql
 
-    texts = [tweet[0] for tweet in tweets]
-    unqiue_texts = list(set(texts))
+    unqiue_hashes = list(set(text_hash(tweet[0]) for tweet in tweets))
     is_classified = (await _query(_builder, _fetchall))[0][0]
     return is_classified
 
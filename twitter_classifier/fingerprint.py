@@ -0,0 +1,134 @@
+"""
+Text fingerprints.
+text_hash - 64-bit hash of normalized text, stored in tweet_texts.hash (unique index)
+    instead of indexing full texts. Same value is calculated by SQL in migrations/002_text_hash.sql.
+SimHashIndex - optional near-duplicate detection (e.g. retweets and bot spam with small changes).
+"""
+import collections
+import hashlib
+import re
+
+
+_TOKEN = re.compile(r"\w+")
+
+
+def normalize(text):
+    """
+    Normalize text before hashing (lower case, single spaces)
+    :type text: str
+    :rtype: str
+    """
+    return " ".join(text.lower().split())
+
+
+def text_hash(text):
+    """
+    Get 64-bit hash of normalized text
+    (first 8 bytes of md5 as signed bigint - same as
+    ('x' || substr(md5(text), 1, 16))::bit(64)::bigint in Postgresql)
+    :type text: str
+    :rtype: int
+    """
+    digest = hashlib.md5(normalize(text).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def _token_hash(token):
+    return int.from_bytes(hashlib.md5(token.encode("utf-8")).digest()[:8], "big")
+
+
+def simhash(text):
+    """
+    Get 64-bit SimHash of text (by word tokens).
+    Hashes of similar texts differ in few bits.
+    :type text: str
+    :return: fingerprint (unsigned)
+    :rtype: int
+    """
+    weights = [0] * 64
+    for token in _TOKEN.findall(text.lower()):
+        value = _token_hash(token)
+        for bit in range(64):
+            if value >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+    result = 0
+    for bit in range(64):
+        if weights[bit] > 0:
+            result |= 1 << bit
+    return result
+
+
+class SimHashIndex:
+    """
+    Bounded index of recent texts by SimHash.
+    Fingerprint is split into max_distance + 1 bands, so texts which fingerprints differ
+        in at most max_distance bits have at least one equal band.
+    """
+
+    def __init__(self, max_distance=3, capacity=100000, min_tokens=5):
+        """
+        :param max_distance: max count of different fingerprint bits of near-duplicate texts
+        :type max_distance: int
+        :param capacity: max count of stored texts (oldest are forgotten first)
+        :type capacity: int
+        :param min_tokens: shorter texts are matched only exactly
+        :type min_tokens: int
+        """
+        assert 0 <= max_distance < 64
+        assert capacity > 0
+        self.max_distance = max_distance
+        self.capacity = capacity
+        self.min_tokens = min_tokens
+        self.bands = max_distance + 1
+        self.band_bits = 64 // self.bands
+        self.texts = collections.OrderedDict()
+        self.buckets = [{} for _ in range(self.bands)]
+
+    def _band_keys(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [fingerprint >> (band * self.band_bits) & mask for band in range(self.bands)]
+
+    def _forget_oldest(self):
+        text, fingerprint = self.texts.popitem(last=False)
+        for bucket, key in zip(self.buckets, self._band_keys(fingerprint)):
+            texts = bucket[key]
+            texts.remove(text)
+            if len(texts) == 0:
+                del bucket[key]
+
+    def find(self, text):
+        """
+        Find stored near-duplicate of text
+        :type text: str
+        :return: stored text or None
+        :rtype: str|None
+        """
+        return self._find(simhash(text))
+
+    def _find(self, fingerprint):
+        for bucket, key in zip(self.buckets, self._band_keys(fingerprint)):
+            for candidate in bucket.get(key, ()):
+                if bin(self.texts[candidate] ^ fingerprint).count("1") <= self.max_distance:
+                    return candidate
+        return None
+
+    def canonical(self, text):
+        """
+        Get stored near-duplicate of text, or store text and return it
+        :type text: str
+        :rtype: str
+        """
+        if len(_TOKEN.findall(text)) < self.min_tokens:
+            return text
+        fingerprint = simhash(text)
+        duplicate = self._find(fingerprint)
+        if duplicate is not None:
+            return duplicate
+        if len(self.texts) >= self.capacity:
+            self._forget_oldest()
+        self.texts[text] = fingerprint
+        for bucket, key in zip(self.buckets, self._band_keys(fingerprint)):
+            bucket.setdefault(key, []).append(text)
+        return text
@@ -0,0 +1,130 @@
+"""
+Fan-out of live sentiment deltas to push (SSE) clients.
+Ingest process sends one notification per classified tweet and stock (see SENTIMENT_CHANNEL),
+    hub sums them by stock and sends summed deltas to subscribers once per interval.
+"""
+import asyncio
+import logging
+import time
+from .metrics import LIVE_SUBSCRIBERS, LIVE_EVENTS
+
+
+SENTIMENT_CHANNEL = "sentiment"
+CLASSES = ("positive", "negative", "neutral")
+
+
+def sentiment_event(stock_id, stock, tweet_id, classification, k, tweet_time):
+    """
+    Build notification payload
+    :param stock_id: stock id
+    :type stock_id: int
+    :param stock: stock filter
+    :type stock: str
+    :param tweet_id: tweet id
+    :type tweet_id: int
+    :param classification: tweet class
+    :type classification: str
+    :param k: user weight
+    :type k: float
+    :param tweet_time: posting time (unix time)
+    :type tweet_time: float
+    :rtype: dict
+    """
+    return {"stock_id": stock_id, "stock": stock, "tweet_id": tweet_id,
+            "classification": classification, "k": k, "time": tweet_time}
+
+
+class Subscription:
+    """
+    One client subscription
+    """
+
+    def __init__(self, stocks, queue_size):
+        """
+        :param stocks: stock filters (None - all stocks)
+        :type stocks: set[str]|None
+        :param queue_size: max count of not sent updates
+        :type queue_size: int
+        """
+        self.stocks = stocks
+        self.queue = asyncio.Queue(queue_size)
+        self.closed = False
+
+
+class LiveHub:
+    """
+    Sum sentiment deltas by stock and send them to subscribers
+    """
+
+    def __init__(self, interval=1.0, queue_size=60):
+        """
+        :param interval: how often summed deltas are sent (seconds)
+        :type interval: float
+        :param queue_size: max not sent updates of subscriber (slow subscribers are disconnected)
+        :type queue_size: int
+        """
+        self.interval = interval
+        self.queue_size = queue_size
+        self.subscriptions = set()
+        self.pending = {}
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._flush_loop())
+
+    def subscribe(self, stocks=None):
+        """
+        :param stocks: stock filters (None - all stocks)
+        :type stocks: set[str]|None
+        :rtype: Subscription
+        """
+        subscription = Subscription(stocks, self.queue_size)
+        self.subscriptions.add(subscription)
+        LIVE_SUBSCRIBERS.set(len(self.subscriptions))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.closed = True
+        self.subscriptions.discard(subscription)
+        LIVE_SUBSCRIBERS.set(len(self.subscriptions))
+
+    def publish(self, event):
+        """
+        Add sentiment notification (see sentiment_event)
+        :type event: dict
+        """
+        LIVE_EVENTS.inc()
+        if event["classification"] not in CLASSES:
+            return
+        delta = self.pending.get(event["stock"])
+        if delta is None:
+            delta = self.pending[event["stock"]] = dict.fromkeys(CLASSES, 0.0)
+        delta[event["classification"]] += event["k"]
+
+    def flush(self):
+        """
+        Send summed deltas to subscribers
+        """
+        if len(self.pending) == 0:
+            return
+        pending = self.pending
+        self.pending = {}
+        now = time.time()
+        for subscription in list(self.subscriptions):
+            if subscription.stocks is None:
+                deltas = pending
+            else:
+                deltas = {stock: delta for stock, delta in pending.items() if stock in subscription.stocks}
+            if len(deltas) == 0:
+                continue
+            try:
+                subscription.queue.put_nowait({"time": now, "deltas": deltas})
+            except asyncio.QueueFull:
+                logging.warning("Live subscriber is too slow, disconnecting it")
+                self.unsubscribe(subscription)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.flush()
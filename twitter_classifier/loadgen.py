@@ -0,0 +1,241 @@
+"""
+Load generator for streaming pipeline.
+Replays dataset (or synthetic) tweets through local stand-in of Twitter streaming API,
+    classifies them with local NLC stub and reports throughput, ingest latency and written rows.
+Tweets are written into database from configuration - use separate database for it.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import random
+import time
+from tornado.platform.asyncio import AsyncIOMainLoop
+from tornado.web import Application, RequestHandler
+from . import log
+from .db import row_counts
+from .logic import Configuration, AppLogic
+from .metrics import CLASSIFIER_CALLS
+from .stub_nlc import make_application as make_nlc_application
+
+
+_WORDS = ["stock", "market", "bull", "bear", "buy", "sell", "earnings", "call", "put", "rally",
+          "crash", "yield", "bond", "growth", "revenue", "guidance", "beat", "miss", "short", "long"]
+
+
+class TweetSource:
+    """
+    Sequence of tweet texts with given part of duplicates
+    """
+
+    def __init__(self, texts, stocks, count, duplicate_ratio, seed=None):
+        """
+        :param texts: texts to replay (None - generate synthetic texts)
+        :type texts: list[str]|None
+        :param stocks: stock filters (each tweet will mention one of them)
+        :type stocks: list[str]
+        :param count: tweets count
+        :type count: int
+        :param duplicate_ratio: part of tweets which repeat one of previous texts
+        :type duplicate_ratio: float
+        :param seed: random seed
+        """
+        self.texts = texts
+        self.stocks = stocks
+        self.count = count
+        self.duplicate_ratio = duplicate_ratio
+        self.random = random.Random(seed)
+
+    @staticmethod
+    def read_texts(path):
+        """
+        Read tweet texts from dataset CSV (first column)
+        :rtype: list[str]
+        """
+        with open(path, "r", encoding="utf-8") as src:
+            return [row[0].lstrip("'") for row in csv.reader(src)]
+
+    def _new_text(self, number):
+        if self.texts is not None:
+            text = self.texts[number % len(self.texts)]
+        else:
+            text = " ".join(self.random.choice(_WORDS) for _ in range(self.random.randint(5, 15)))
+            text += " {0}".format(number)
+        text_lower = text.lower()
+        if not any(("$" + stock.lower()) in text_lower or ("#" + stock.lower()) in text_lower
+                   for stock in self.stocks):
+            text += " $" + self.random.choice(self.stocks)
+        return text
+
+    def __iter__(self):
+        previous = []
+        for number in range(self.count):
+            if len(previous) != 0 and self.random.random() < self.duplicate_ratio:
+                yield self.random.choice(previous)
+            else:
+                text = self._new_text(number)
+                previous.append(text)
+                yield text
+
+
+class StreamGenerator:
+    """
+    Writes tweets of source into streaming responses with given rate
+    """
+
+    def __init__(self, source, rate):
+        """
+        :param source: tweet texts
+        :type source: TweetSource
+        :param rate: tweets per second
+        :type rate: float
+        """
+        self.source = iter(source)
+        self.rate = rate
+        self.sequence = 0
+        self.emitted = {}
+        self.exhausted = False
+
+    @staticmethod
+    def tweet(sequence, text):
+        now = time.time()
+        return {
+            "id": sequence,
+            "id_str": str(sequence),
+            "text": text,
+            "created_at": time.strftime("%a %b %d %H:%M:%S +0000 %Y", time.gmtime(now)),
+            "timestamp_ms": str(int(now * 1000)),
+            # uid is used to find emit time of tweet
+            "user": {"id": sequence, "screen_name": "loadgen{0}".format(sequence)}
+        }
+
+    async def write(self, handler):
+        """
+        Write tweets into streaming response
+        :type handler: RequestHandler
+        """
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        sent = 0
+        while not self.exhausted:
+            due = int((loop.time() - started) * self.rate) - sent
+            for _ in range(max(due, 0)):
+                try:
+                    text = next(self.source)
+                except StopIteration:
+                    self.exhausted = True
+                    break
+                self.sequence += 1
+                handler.write(json.dumps(StreamGenerator.tweet(self.sequence, text)) + "\r\n")
+                self.emitted[self.sequence] = time.perf_counter()
+                sent += 1
+            await handler.flush()
+            await asyncio.sleep(0.01)
+        while True:
+            # keep-alive, like Twitter does
+            handler.write("\r\n")
+            await handler.flush()
+            await asyncio.sleep(1)
+
+
+class _StreamHandler(RequestHandler):
+    def initialize(self, generator):
+        self.generator = generator
+
+    async def post(self):
+        self.set_header("Content-Type", "application/json")
+        await self.generator.write(self)
+
+
+def make_stream_application(generator):
+    """
+    Build application which serves statuses/filter streaming endpoint
+    (use "http://127.0.0.1:PORT/{api}/{version}" as twitter.base_url)
+    :type generator: StreamGenerator
+    :rtype: Application
+    """
+    return Application([
+        (r'/stream/1.1/statuses/filter.json', _StreamHandler, {"generator": generator})
+    ])
+
+
+class _MeasuredLogic(AppLogic):
+    def __init__(self, configuration, generator, expected):
+        super().__init__(configuration)
+        self.generator = generator
+        self.expected = expected
+        self.latencies = []
+        self.done = asyncio.Future()
+
+    async def handle_tweet(self, text, clean_text, time_, uid):
+        await super().handle_tweet(text, clean_text, time_, uid)
+        self.latencies.append(time.perf_counter() - self.generator.emitted[uid])
+        if len(self.latencies) >= self.expected and not self.done.done():
+            self.done.set_result(None)
+
+
+def _percentile(values, part):
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(part * len(ordered)))]
+
+
+async def run(config, args):
+    stocks = args.stocks.split(",")
+    texts = TweetSource.read_texts(args.source) if args.source is not None else None
+    source = TweetSource(texts, stocks, args.tweets, args.duplicates, args.seed)
+    generator = StreamGenerator(source, args.rate)
+    make_stream_application(generator).listen(args.stream_port)
+    make_nlc_application({}, args.nlc_latency, args.nlc_error_rate).listen(args.nlc_port)
+
+    config.twitter.base_url = "http://127.0.0.1:{0}/{{api}}/{{version}}".format(args.stream_port)
+    config.nlc.base_url = "http://127.0.0.1:{0}/natural-language-classifier".format(args.nlc_port)
+    config.follow_stocks = stocks
+    logic = _MeasuredLogic(config, generator, args.tweets)
+    await logic.initialize()
+    rows_before = await row_counts()
+
+    started = time.perf_counter()
+    stream_task = asyncio.ensure_future(logic.twitter_streams())
+    try:
+        await asyncio.wait_for(asyncio.shield(logic.done), args.timeout)
+    except asyncio.TimeoutError:
+        logging.error("Timeout: only {0} of {1} tweets processed".format(len(logic.latencies), args.tweets))
+    elapsed = time.perf_counter() - started
+    stream_task.cancel()
+    rows_after = await row_counts()
+
+    processed = len(logic.latencies)
+    print("Tweets processed : {0} of {1} in {2:.2f}s".format(processed, args.tweets, elapsed))
+    print("Throughput : {0:.1f} tweets/s (offered {1:.1f} tweets/s)".format(processed / elapsed, args.rate))
+    print("Ingest latency : p50 {0:.1f}ms, p99 {1:.1f}ms".format(
+        _percentile(logic.latencies, 0.5) * 1000, _percentile(logic.latencies, 0.99) * 1000))
+    for table in sorted(rows_after):
+        print("Rows written to {0} : {1}".format(table, rows_after[table] - rows_before[table]))
+    for labels, counter in sorted(CLASSIFIER_CALLS.children.items()):
+        print("Classifier calls with status {0} : {1}".format(labels[0], counter.value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay tweets through streaming pipeline and measure it")
+    parser.add_argument("config", help="configuration file (its database will be written)")
+    parser.add_argument("--source", default=None,
+                        help="dataset CSV to replay (tweet texts in first column); synthetic tweets if omitted")
+    parser.add_argument("--tweets", type=int, default=5000, help="tweets count")
+    parser.add_argument("--rate", type=float, default=200, help="tweets per second")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="part of repeated texts")
+    parser.add_argument("--stocks", default="AAPL,TWTR,MSFT", help="comma-separated stock filters")
+    parser.add_argument("--stream-port", type=int, default=8020)
+    parser.add_argument("--nlc-port", type=int, default=8010)
+    parser.add_argument("--nlc-latency", type=float, default=0.05, help="NLC stub answer delay (seconds)")
+    parser.add_argument("--nlc-error-rate", type=float, default=0.3, help="NLC stub part of non-neutral answers")
+    parser.add_argument("--timeout", type=float, default=600, help="max run time (seconds)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = Configuration.from_file(args.config)
+    log.setup(config.log_level, config.log_sampling)
+    AsyncIOMainLoop().install()
+    asyncio.get_event_loop().run_until_complete(run(config, args))
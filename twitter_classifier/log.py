@@ -0,0 +1,162 @@
+"""
+Non-blocking structured logging.
+Records are put into bounded queue by event loop and written as JSON lines by background thread,
+so slow stdout consumer can't block event loop (records are dropped if queue is full).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from .metrics import LOG_RECORDS_DROPPED
+
+
+EVENTS_LOGGER = "twitter_classifier.events"
+# Per-tweet events: only 1 of N records is written
+DEFAULT_SAMPLING = {
+    "tweet_stored": 100,
+    "tweet_mapped": 100
+}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format record as one-line JSON object
+    """
+
+    def format(self, record):
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        fields = getattr(record, "fields", None)
+        if fields is not None:
+            entry.update(fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Pass only 1 of N records of sampled events
+    """
+
+    def __init__(self, rates):
+        """
+        :param rates: event name - N dict
+        :type rates: dict[str, int]
+        """
+        super(SamplingFilter, self).__init__()
+        self.rates = rates
+        self.seen = {}
+        self.sampled_out = LOG_RECORDS_DROPPED.labels("sampled")
+
+    def filter(self, record):
+        event = getattr(record, "event", None)
+        rate = self.rates.get(event, 1) if event is not None else 1
+        if rate <= 1:
+            return True
+        seen = self.seen.get(event, 0)
+        self.seen[event] = seen + 1
+        if seen % rate == 0:
+            return True
+        self.sampled_out.inc()
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler which never waits: formatting is made by listener thread,
+    and records are dropped when queue is full
+    """
+
+    def __init__(self, records_queue):
+        super(NonBlockingQueueHandler, self).__init__(records_queue)
+        self.queue_full = LOG_RECORDS_DROPPED.labels("queue_full")
+
+    def prepare(self, record):
+        # Resolve message and traceback now - arguments may change before listener formats record
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.queue_full.inc()
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for free place (at exit) instead of failing on full queue
+        self.queue.put(self._sentinel)
+
+
+def setup(level, sampling=None, stream=None, queue_size=10000):
+    """
+    Replace root logger handlers by non-blocking JSON-lines handler
+    :param level: log level (see Configuration.log_level)
+    :type level: int
+    :param sampling: event name - N dict (only 1 of N records of event will be written)
+    :type sampling: dict[str, int]|None
+    :param stream: output stream (stdout by default)
+    :param queue_size: max count of not written records
+    :type queue_size: int
+    :return: listener (stopped at exit)
+    :rtype: logging.handlers.QueueListener
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+    output = logging.StreamHandler(stream if stream is not None else sys.stdout)
+    output.setFormatter(JsonFormatter())
+    records_queue = queue.Queue(queue_size)
+    handler = NonBlockingQueueHandler(records_queue)
+    handler.addFilter(SamplingFilter(sampling if sampling is not None else DEFAULT_SAMPLING))
+    root = logging.getLogger()
+    for old_handler in list(root.handlers):
+        root.removeHandler(old_handler)
+    root.addHandler(handler)
+    root.setLevel(level)
+    _listener = _Listener(records_queue, output)
+    _listener.start()
+    return _listener
+
+
+def shutdown():
+    """
+    Write queued records and stop listener thread
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown)
+
+
+def event(name, level=logging.INFO, **fields):
+    """
+    Log structured event
+    :param name: event name (used as message and for sampling)
+    :type name: str
+    :param level: log level
+    :type level: int
+    :param fields: event fields
+    """
+    logger = logging.getLogger(EVENTS_LOGGER)
+    if logger.isEnabledFor(level):
+        logger.log(level, name, extra={"event": name, "fields": fields})
@@ -2,13 +2,32 @@
 Application logic.
 """
 import asyncio
+import calendar
 import datetime
 import json
 import logging
 import math
-from .db import connect, stocks, stock_stats, store_tweets, stock_by_filter, map_tweets_to_stock, find_texts, update_classification, stocks, whitelist_hashtags
-from twitter_classifier.twitter import TwitterClient
-from .watson_nlc import AsyncNaturalLanguageClassifier, All
+from .fingerprint import SimHashIndex
+from .db import connect, stocks, stock_stats, store_tweets, stock_by_filter, map_tweets_to_stock, update_classification, stocks, whitelist_hashtags, text_classifications, notify, listen, recent_sentiment, stock_ids
+from .live import SENTIMENT_CHANNEL, sentiment_event
+from .log import event
+from .users import USERS_CHANNEL
+from .metrics import TWEETS_DROPPED, STREAM_LAG, STAGE_LATENCY, CACHE_LOOKUPS
+from .window import SentimentWindow, RELOAD_CHANNEL
+
+
+_DROPPED_EMPTY = TWEETS_DROPPED.labels("empty")
+_STORE_LATENCY = STAGE_LATENCY.labels("store")
+_MATCH_LATENCY = STAGE_LATENCY.labels("match")
+_CLASSIFY_LATENCY = STAGE_LATENCY.labels("classify")
+_UPDATE_LATENCY = STAGE_LATENCY.labels("update")
+_CLASSIFICATION_HITS = CACHE_LOOKUPS.labels("classification", "hit")
+_CLASSIFICATION_MISSES = CACHE_LOOKUPS.labels("classification", "miss")
+_DEDUP_LATENCY = STAGE_LATENCY.labels("dedup")
+_NEAR_DUPLICATE_HITS = CACHE_LOOKUPS.labels("near_duplicate", "hit")
+_NEAR_DUPLICATE_MISSES = CACHE_LOOKUPS.labels("near_duplicate", "miss")
+_STOCK_ID_HITS = CACHE_LOOKUPS.labels("stock_id", "hit")
+_STOCK_ID_MISSES = CACHE_LOOKUPS.labels("stock_id", "miss")
 
 
 class Configuration:
@@ -22,6 +41,7 @@ class Configuration:
             self.access_token = config["access_token"]
             self.access_token_secret = config["access_token_secret"]
             self.user_filter_per_request = config["user_filter_per_request"]
+            self.base_url = config.get("base_url")
 
     class _NlcConfiguration:
         def __init__(self, config):
@@ -29,13 +49,23 @@ class Configuration:
             self.password = config["password"]
             self.classifiers = config["classifiers"]
             self.text_per_block = config["text_per_block"]
+            self.base_url = config.get("base_url")
 
     def __init__(self, config):
         self.twitter = Configuration._TwitterConfiguration(config["twitter"])
         self.nlc = Configuration._NlcConfiguration(config["nlc"])
         self.database = config["db"]
+        self.database_fetch_size = config.get("db_fetch_size", 1000)
         self.port = config["port"]
+        self.metrics_port = config.get("metrics_port", self.port + 1)
         self.log_level = config["log_level"]
+        self.log_sampling = config.get("log_sampling")
+        self.window_seconds = config.get("window_seconds", 86400)
+        self.simhash_distance = config.get("simhash_distance")
+        self.simhash_capacity = config.get("simhash_capacity", 100000)
+        self.json_backend = config.get("json_backend")
+        self.export_concurrency = config.get("export_concurrency", 4)
+        self.export_timeout = config.get("export_timeout", 60)
         self.follow_stocks = config["follow_stocks"]
 
     @staticmethod
@@ -57,6 +87,8 @@ class AppLogic:
     Application logic class
     """
     FROM_USERS_FILTER = "$FROM_USERS$"
+    # seconds between window reset and its reloading
+    WINDOW_RELOAD_DELAY = 1.0
 
     def __init__(self, configuration):
         """
@@ -64,13 +96,20 @@ class AppLogic:
         :type configuration: Configuration
         """
         self.configuration = configuration
+        self.window = None
+        self._hydration = None
+        # filter - stock id (stocks are never deleted, filters are unique)
+        self.stock_ids = {}
+        self.near_duplicates = None
+        if configuration.simhash_distance is not None:
+            self.near_duplicates = SimHashIndex(configuration.simhash_distance, configuration.simhash_capacity)
 
     async def initialize(self):
         """
         Initialize logic
         """
         logging.info("Initialization DB")
-        await connect(self.configuration.database)
+        await connect(self.configuration.database, self.configuration.database_fetch_size)
 
     async def stocks(self):
         """
@@ -80,16 +119,42 @@ class AppLogic:
         """
         return await stocks()
 
+    async def load_stock_ids(self):
+        """
+        Fill stock id cache with existing stocks
+        """
+        self.stock_ids.update(await stock_ids())
+
+    async def stock_by_filter(self, stock_filter):
+        """
+        Find (or create) stock by filter without database query for known stocks
+        :param stock_filter: filter
+        :type stock_filter: str
+        :return: stock id
+        :rtype: int
+        """
+        stock_id = self.stock_ids.get(stock_filter)
+        if stock_id is not None:
+            _STOCK_ID_HITS.inc()
+            return stock_id
+        _STOCK_ID_MISSES.inc()
+        stock_id = await stock_by_filter(stock_filter)
+        self.stock_ids[stock_filter] = stock_id
+        return stock_id
+
     def twitter_client(self):
         """
         Get twitter client instance
         :return: client
         :rtype: TwitterClient
         """
+        # peony is imported only by streaming process
+        from .twitter import TwitterClient
         return TwitterClient(self.configuration.twitter.consumer_key,
                              self.configuration.twitter.consumer_secret,
                              self.configuration.twitter.access_token,
-                             self.configuration.twitter.access_token_secret)
+                             self.configuration.twitter.access_token_secret,
+                             base_url=self.configuration.twitter.base_url)
 
     def nlc(self):
         """
@@ -97,8 +162,14 @@ class AppLogic:
         :return: classifier
         :rtype: AsyncNaturalLanguageClassifier
         """
+        # aiohttp is imported only by processes which classify texts
+        from .watson_nlc import AsyncNaturalLanguageClassifier
+        kwargs = {}
+        if self.configuration.nlc.base_url is not None:
+            kwargs["base_url"] = self.configuration.nlc.base_url
         return AsyncNaturalLanguageClassifier(self.configuration.nlc.username,
-                                              self.configuration.nlc.password)
+                                              self.configuration.nlc.password,
+                                              **kwargs)
 
     async def _classify_text(self, text):
         """
@@ -128,7 +199,12 @@ class AppLogic:
         :rtype: (float, float, float)
         """
         logging.info("Building start for stock {0} in {1}-{2}".format(stock_id, from_time, to_time))
-        positive, negative, neutral = await stock_stats(stock_id, from_time, to_time)
+        sums = None
+        if self.window is not None:
+            sums = self.window.stats(stock_id, from_time, to_time)
+        if sums is None:
+            sums = await stock_stats(stock_id, from_time, to_time)
+        positive, negative, neutral = sums
         if exclude_neutral:
             neutral = 0
             total = positive + negative
@@ -139,6 +215,109 @@ class AppLogic:
         else:
             return positive / total, negative / total, neutral / total
 
+    async def follow_sentiment(self, hub):
+        """
+        Keep live hub and sentiment window (if enabled) current
+            with notifications of streaming process. Runs forever.
+        :param hub: live hub
+        :type hub: LiveHub
+        """
+        if self.configuration.window_seconds:
+            self.window = SentimentWindow(self.configuration.window_seconds)
+
+        def _on_event(event):
+            hub.publish(event)
+            if self.window is not None:
+                self.window.publish(event)
+
+        def _reload_window(*_):
+            # Notifications could be lost before (re)connection,
+            # users weights or classifications (by backfill) could be changed
+            if self.window is not None:
+                if self._hydration is not None:
+                    self._hydration.cancel()
+                self.window.reset()
+                # Backfill notifies after every chunk - so burst of notifications starts one hydration
+                self._hydration = asyncio.ensure_future(self._hydrate_window(self.WINDOW_RELOAD_DELAY))
+
+        if self.window is not None:
+            asyncio.ensure_future(listen(USERS_CHANNEL, _reload_window))
+            asyncio.ensure_future(listen(RELOAD_CHANNEL, _reload_window))
+        await listen(SENTIMENT_CHANNEL, _on_event, _reload_window)
+
+    async def _hydrate_window(self, delay=0):
+        try:
+            await asyncio.sleep(delay)
+            await self.window.hydrate(recent_sentiment(self.window.hydration_start()))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception("Can't load sentiment window")
+
+    async def handle_tweet(self, text, clean_text, time, uid):
+        """
+        Store tweet, map it to followed stocks and classify its text
+        :param text: original tweet text
+        :type text: str
+        :param clean_text: cleaned text
+        :type clean_text: str
+        :param time: posting time (UTC)
+        :type time: datetime.datetime
+        :param uid: user id
+        :type uid: int
+        """
+        STREAM_LAG.observe((datetime.datetime.utcnow() - time).total_seconds())
+        if clean_text == '':
+            _DROPPED_EMPTY.inc()
+            return
+        if self.near_duplicates is not None:
+            with _DEDUP_LATENCY.time():
+                canonical_text = self.near_duplicates.canonical(clean_text)
+            if canonical_text != clean_text:
+                _NEAR_DUPLICATE_HITS.inc()
+                clean_text = canonical_text
+            else:
+                _NEAR_DUPLICATE_MISSES.inc()
+        with _STORE_LATENCY.time():
+            text_ids, tweet_ids, weights = await store_tweets([(clean_text, time, uid)])
+        tweet_id = tweet_ids[0]
+        event("tweet_stored", tweet_id=tweet_id, uid=uid)
+        with _MATCH_LATENCY.time():
+            text_lower = text.lower()
+            mapped_stocks = []
+            for stream in self.configuration.follow_stocks:
+                stream_lower = stream.lower()
+                if ('#' + stream_lower) in text_lower or \
+                        ('$' + stream_lower) in text_lower:
+                    stock_id = await self.stock_by_filter(stream)
+                    await map_tweets_to_stock(stock_id, tweet_ids)
+                    mapped_stocks.append((stock_id, stream))
+                    event("tweet_mapped", tweet_id=tweet_id, stock_id=stock_id, stock=stream)
+        if len(mapped_stocks) != 0:
+            text_id = text_ids[clean_text]
+            # Repeated text keeps stored classification - it isn't sent to Watson again
+            classification = (await text_classifications([text_id])).get(text_id)
+            if classification is not None:
+                _CLASSIFICATION_HITS.inc()
+                event("tweet_classified", tweet_id=tweet_id, text_id=text_id,
+                      classification=classification, cached=True)
+            else:
+                _CLASSIFICATION_MISSES.inc()
+                try:
+                    with _CLASSIFY_LATENCY.time():
+                        classification = await self._classify_text(clean_text)
+                except Exception:
+                    # Text stays unclassified (see twitter_classifier_backfill --only-unclassified)
+                    logging.exception("Can't classify text {0} of tweet {1}".format(text_id, tweet_id))
+                    return
+                event("tweet_classified", tweet_id=tweet_id, text_id=text_id,
+                      classification=classification, cached=False)
+                with _UPDATE_LATENCY.time():
+                    await update_classification({text_id: classification})
+            tweet_time = calendar.timegm(time.timetuple())
+            await notify(SENTIMENT_CHANNEL, [sentiment_event(stock_id, stock, tweet_id, classification, weights[0], tweet_time)
+                                             for stock_id, stock in mapped_stocks])
+
     async def twitter_streams(self):
         """
         Run Twitter Streaming processing
@@ -151,31 +330,8 @@ class AppLogic:
 
         whitelist = await whitelist_hashtags()
         streams = self.configuration.follow_stocks
-        print("Monitoring stocks {0}".format(streams))
+        logging.info("Monitoring stocks {0}".format(streams))
         twitter = self.twitter_client()
-
-        async def tweet_handler(text, clean_text, time, uid):
-            if clean_text == '':
-                return
-            _, tweet_ids = await store_tweets([(clean_text, time, uid)])
-            tweet_id = tweet_ids[0]
-            print("Stored new tweet with id {0}".format(tweet_ids[0]))
-            text_lower = text.lower()
-            mapped_stocks = 0
-            for stream in streams:
-                stream_lower = stream.lower()
-                if ('#' + stream_lower) in text_lower or \
-                        ('$' + stream_lower) in text_lower:
-                    stock_id = await stock_by_filter(stream)
-                    await map_tweets_to_stock(stock_id, tweet_ids)
-                    mapped_stocks += 1
-                    print("Tweet {0} mapped to stock {1} ({2})".format(tweet_id, stock_id, stream))
-            if mapped_stocks != 0:
-                text_id = (await find_texts([clean_text]))[clean_text]
-                classification = await self._classify_text(clean_text)
-                print("Tweet {0} has text with ID {1} classified as {2}".format(tweet_id, text_id, classification))
-                await update_classification({text_id: classification})
-
-        await twitter.stream_handle(tweet_handler,
+        await twitter.stream_handle(self.handle_tweet,
                                     lambda text: _replace_whitelist(whitelist, text),
                                     track=",".join(streams))
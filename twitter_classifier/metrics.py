@@ -0,0 +1,208 @@
+"""
+In-process metrics in Prometheus text format.
+Updates are plain attribute increments (no locks - every process is single-threaded asyncio),
+so instrumentation can stay enabled on the ingest hot path.
+"""
+import bisect
+import time
+
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if len(pairs) == 0:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                          for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """
+    Monotonic counter
+    """
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def _samples(self, name):
+        yield name, None, self.value
+
+
+class Gauge:
+    """
+    Value which can go up and down
+    """
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def _samples(self, name):
+        yield name, None, self.value
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Histogram:
+    """
+    Distribution of values by fixed buckets
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: sorted bucket upper bounds (+Inf bucket is added automatically)
+        :type buckets: tuple[float]
+        """
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def time(self):
+        """
+        Observe duration of with-block (in seconds)
+        :rtype: _Timer
+        """
+        return _Timer(self)
+
+    def _samples(self, name):
+        total = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            total += count
+            yield name + "_bucket", ("le", _format_value(bound)), total
+        yield name + "_count", None, total
+        yield name + "_sum", None, self.sum
+
+
+class _Family:
+    """
+    Metric with labels. Children are cached, so hot code can keep result of labels() call.
+    Metric without labels has one child
+    """
+
+    def __init__(self, name, documentation, metric_type, factory, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.factory = factory
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+
+    def labels(self, *values):
+        """
+        Get child metric for given label values
+        """
+        assert len(values) == len(self.labelnames)
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self.factory()
+        return child
+
+    def expose(self):
+        lines = ["# HELP {0} {1}".format(self.name, self.documentation),
+                 "# TYPE {0} {1}".format(self.name, self.metric_type)]
+        for values, child in sorted(self.children.items()):
+            for sample_name, extra, value in child._samples(self.name):
+                lines.append("{0}{1} {2}".format(sample_name,
+                                                 _format_labels(self.labelnames, values, extra),
+                                                 _format_value(value)))
+        return "\n".join(lines)
+
+
+class Registry:
+    """
+    Set of metrics of one process
+    """
+
+    def __init__(self):
+        self.families = []
+
+    def _register(self, name, documentation, metric_type, factory, labelnames):
+        """
+        :return: family (or its only child if metric haven't labels)
+        """
+        family = _Family(name, documentation, metric_type, factory, labelnames)
+        self.families.append(family)
+        if len(family.labelnames) == 0:
+            return family.labels()
+        return family
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(name, documentation, "counter", Counter, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(name, documentation, "gauge", Gauge, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(name, documentation, "histogram", lambda: Histogram(buckets), labelnames)
+
+    def expose(self):
+        """
+        Build Prometheus text exposition
+        :rtype: str
+        """
+        return "\n".join(family.expose() for family in self.families) + "\n"
+
+
+REGISTRY = Registry()
+
+TWEETS_RECEIVED = REGISTRY.counter(
+    "twitter_classifier_tweets_received_total", "Tweets received from stream")
+TWEETS_DROPPED = REGISTRY.counter(
+    "twitter_classifier_tweets_dropped_total", "Tweets dropped before storing", ["reason"])
+STREAM_LAG = REGISTRY.histogram(
+    "twitter_classifier_stream_lag_seconds", "Delay between tweet creation and processing",
+    buckets=(0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+STAGE_LATENCY = REGISTRY.histogram(
+    "twitter_classifier_stage_seconds", "Latency of ingest pipeline stages", ["stage"])
+CLASSIFIER_CALLS = REGISTRY.counter(
+    "twitter_classifier_classifier_calls_total", "Classifier calls by HTTP status", ["status"])
+DB_POOL_WAIT = REGISTRY.histogram(
+    "twitter_classifier_db_pool_wait_seconds", "Time spent waiting for DB connection")
+CACHE_LOOKUPS = REGISTRY.counter(
+    "twitter_classifier_cache_lookups_total", "Cache lookups by result", ["cache", "result"])
+HTTP_REQUESTS = REGISTRY.histogram(
+    "twitter_classifier_http_request_seconds", "API request latency", ["handler", "success"])
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "twitter_classifier_log_records_dropped_total", "Log records not written", ["reason"])
+LIVE_SUBSCRIBERS = REGISTRY.gauge(
+    "twitter_classifier_live_subscribers", "Connected live sentiment clients")
+LIVE_EVENTS = REGISTRY.counter(
+    "twitter_classifier_live_events_total", "Sentiment notifications received by live hub")
@@ -0,0 +1,78 @@
+"""
+JSON serialization with pluggable backend.
+Uses accelerated library if it is installed (orjson, then ujson), else - standard json module.
+All backends return UTF-8 bytes.
+"""
+import json
+
+
+def _orjson():
+    import orjson
+    return orjson.dumps
+
+
+def _ujson():
+    import ujson
+
+    def _dumps(value):
+        return ujson.dumps(value).encode("utf-8")
+    return _dumps
+
+
+def _json():
+    def _dumps(value):
+        return json.dumps(value).encode("utf-8")
+    return _dumps
+
+
+# name - function which imports backend and returns its dumps function
+BACKENDS = {
+    "orjson": _orjson,
+    "ujson": _ujson,
+    "json": _json
+}
+PREFERENCE = ["orjson", "ujson", "json"]
+
+backend = None
+dumps = None
+
+
+def available():
+    """
+    Get names of installed backends (imports all of them - use it for benchmarks, not at startup)
+    :rtype: list[str]
+    """
+    result = []
+    for name in PREFERENCE:
+        try:
+            BACKENDS[name]()
+            result.append(name)
+        except ImportError:
+            pass
+    return result
+
+
+def use(name=None):
+    """
+    Select backend.
+    After it - dumps(value) serializes JSON-serializable value
+        (dicts with string keys, lists, strings, numbers, bool, None) to UTF-8 encoded bytes.
+    :param name: backend name (one of BACKENDS). Fastest installed backend if None
+    :type name: str|None
+    """
+    global backend, dumps
+    if name is not None:
+        dumps = BACKENDS[name]()
+        backend = name
+        return
+    # Import only first installed backend
+    for name in PREFERENCE:
+        try:
+            dumps = BACKENDS[name]()
+        except ImportError:
+            continue
+        backend = name
+        return
+
+
+use()
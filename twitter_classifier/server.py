@@ -1,44 +1,289 @@
+import argparse
 import atexit
 import signal
 import asyncio
+import csv
 import datetime
-import json
+import io
 import logging
 import os
 import sys
-import traceback
+import time
+import zlib
+from collections import OrderedDict
 from tornado.platform.asyncio import AsyncIOMainLoop
+from tornado.iostream import StreamClosedError
 from tornado.web import Application, RequestHandler
-from . import db
+from . import db, log, serialization
+from .live import LiveHub
 from .logic import Configuration, AppLogic
+from .metrics import REGISTRY, HTTP_REQUESTS
+
+
+CHECK_TIMEOUT = 10
 
 
 class JsonRequestHandler(RequestHandler):
-    def send_answer(self, answer):
-        json_data = json.dumps(answer)
+    """
+    JSON (or JSONP) answers, serialized by fastest installed JSON library (see serialization).
+    Answers bigger than MIN_COMPRESS_SIZE are compressed if client accepts gzip or deflate,
+        answers bigger than CHUNK_SIZE are sent by chunks.
+    """
+    # Content-Encoding - zlib wbits (in order of preference)
+    ENCODINGS = OrderedDict([
+        ("gzip", 16 + zlib.MAX_WBITS),
+        ("deflate", zlib.MAX_WBITS)
+    ])
+    MIN_COMPRESS_SIZE = 1024
+    # compression runs in event loop - fast level (see benchmarks/json_encoding.py)
+    COMPRESSION_LEVEL = 1
+    CHUNK_SIZE = 64 * 1024
+    _compressor = None
+
+    def _encoding(self):
+        """
+        Choose response encoding by Accept-Encoding header
+        :return: "gzip", "deflate" or None
+        :rtype: str|None
+        """
+        accepted = {}
+        for part in self.request.headers.get("Accept-Encoding", "").split(","):
+            params = part.split(";")
+            name = params[0].strip().lower()
+            quality = 1.0
+            for param in params[1:]:
+                key, _, value = param.partition("=")
+                if key.strip() == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            if name != "":
+                accepted[name] = quality
+        for encoding in self.ENCODINGS:
+            if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                return encoding
+        return None
+
+    def _begin_body(self, size=None):
+        """
+        Choose response encoding
+        :param size: uncompressed body size (None - unknown, e.g. for streamed body)
+        :type size: int|None
+        """
+        self.set_header("Vary", "Accept-Encoding")
+        self._compressor = None
+        if size is not None and size < self.MIN_COMPRESS_SIZE:
+            return
+        encoding = self._encoding()
+        if encoding is not None:
+            self.set_header("Content-Encoding", encoding)
+            self._compressor = zlib.compressobj(self.COMPRESSION_LEVEL, zlib.DEFLATED, self.ENCODINGS[encoding])
+
+    def _write_body(self, data):
+        """
+        Write (and compress if needed) part of body
+        :type data: bytes
+        """
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        if len(data) != 0:
+            self.write(data)
+
+    def _end_body(self):
+        if self._compressor is not None:
+            self.write(self._compressor.flush())
+        self.finish()
+
+    def serialize(self, answer):
+        """
+        Serialize answer (and wrap it into JSONP callback if requested)
+        :rtype: bytes
+        """
+        json_data = serialization.dumps(answer)
         wrapper = self.get_argument("jsonp_wrapper", None)
         if wrapper is None:
             self.set_header("Content-Type", "application/json")
-            self.write(json_data)
+            return json_data
         else:
             self.set_header("Content-Type", "application/javascript")
-            self.write(wrapper + "(" + json_data + ")")
-        self.finish()
+            return wrapper.encode("utf-8") + b"(" + json_data + b")"
+
+    async def send_data(self, data):
+        """
+        Send serialized answer
+        :type data: bytes
+        """
+        self._begin_body(len(data))
+        if len(data) <= self.CHUNK_SIZE:
+            self._write_body(data)
+        else:
+            for offset in range(0, len(data), self.CHUNK_SIZE):
+                self._write_body(data[offset:offset + self.CHUNK_SIZE])
+                await self.flush()
+        self._end_body()
+
+    async def send_answer(self, answer):
+        await self.send_data(self.serialize(answer))
 
     async def get(self):
+        started = time.perf_counter()
+        success = False
         try:
             result = await asyncio.get_event_loop().create_task(self._get())
-            self.send_answer({"success": True, "response": result})
+            data = self.serialize({"success": True, "response": result})
+            success = True
         except Exception as err:
-            self.send_answer({"success": False})
-            traceback.print_exc()
+            data = self.serialize({"success": False})
+            logging.exception("{0} failed".format(type(self).__name__))
+        try:
+            await self.send_data(data)
+        finally:
+            HTTP_REQUESTS.labels(type(self).__name__, str(success).lower()).observe(time.perf_counter() - started)
 
     async def _get(self):
         raise NotImplementedError()
 
 
-def run_server(config_path, is_stream_process):
-    print("Run server")
+class ExportRequestHandler(JsonRequestHandler):
+    """
+    Stream rows as NDJSON or CSV without buffering whole result.
+    Errors before first row are reported as usual JSON answer,
+        errors after it abort connection.
+    """
+    FORMATS = {
+        "ndjson": "application/x-ndjson",
+        "csv": "text/csv"
+    }
+    COLUMNS = ["id", "time", "uid", "text", "classification"]
+    FLUSH_EVERY = 500
+
+    def initialize(self, exports=None):
+        """
+        :param exports: limit of concurrent exports
+            (every export holds pooled DB connection while client downloads it)
+        :type exports: asyncio.Semaphore|None
+        """
+        self.exports = exports
+
+    async def get(self):
+        if self.exports is None:
+            await self._export()
+            return
+        if self.exports.locked():
+            logging.warning("Too many concurrent exports, request rejected")
+            self.set_status(503)
+            await self.send_answer({"success": False})
+            return
+        async with self.exports:
+            await self._export()
+
+    async def _export(self):
+        started = False
+        try:
+            export_format = self.get_argument("format", "ndjson")
+            assert export_format in self.FORMATS
+            rows = await self._rows()
+            async with rows:
+                self.set_header("Content-Type", self.FORMATS[export_format])
+                self._begin_body()
+                started = True
+                if export_format == "csv":
+                    self._write_body(self._csv_line(self.COLUMNS))
+                written = 0
+                async for row in rows:
+                    if export_format == "csv":
+                        self._write_body(self._csv_line(self._row_values(row)))
+                    else:
+                        self._write_body(serialization.dumps(dict(zip(self.COLUMNS, self._row_values(row)))) + b"\n")
+                    written += 1
+                    if written % self.FLUSH_EVERY == 0:
+                        await self.flush()
+            self._end_body()
+        except Exception:
+            logging.exception("{0} failed".format(type(self).__name__))
+            if started:
+                # Abort connection (instead of finishing response), so client sees that export is truncated
+                self.request.connection.close()
+            else:
+                await self.send_answer({"success": False})
+
+    @staticmethod
+    def _row_values(row):
+        tweet_id, time, uid, text, classification = row
+        return [tweet_id, time.isoformat(), uid, text, classification]
+
+    @staticmethod
+    def _csv_line(values):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(values)
+        return buffer.getvalue().encode("utf-8")
+
+    async def _rows(self):
+        raise NotImplementedError()
+
+
+class MetricsHandler(RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.write(REGISTRY.expose())
+
+
+class LiveRequestHandler(RequestHandler):
+    """
+    Server-Sent Events stream of summed sentiment deltas
+    """
+    KEEPALIVE = 15
+
+    def initialize(self, hub):
+        """
+        :type hub: LiveHub
+        """
+        self.hub = hub
+        self.subscription = None
+
+    async def get(self):
+        stocks = self.get_argument("q", "")
+        if stocks != "":
+            stocks = set(stocks.split(","))
+        else:
+            stocks = None
+        self.subscription = self.hub.subscribe(stocks)
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+        try:
+            self.write("retry: 5000\n\n")
+            await self.flush()
+            while not self.subscription.closed:
+                try:
+                    update = await asyncio.wait_for(self.subscription.queue.get(), self.KEEPALIVE)
+                    self.write(b"data: " + serialization.dumps(update) + b"\n\n")
+                except asyncio.TimeoutError:
+                    self.write(": keep-alive\n\n")
+                await self.flush()
+        except StreamClosedError:
+            pass
+        finally:
+            self.hub.unsubscribe(self.subscription)
+        if not self.request.connection.stream.closed():
+            self.finish()
+
+    def on_connection_close(self):
+        if self.subscription is not None:
+            self.hub.unsubscribe(self.subscription)
+
+
+def _run_stream(config):
+    logic = AppLogic(config)
+    asyncio.get_event_loop().run_until_complete(logic.initialize())
+    AsyncIOMainLoop().install()
+    Application([
+        (r'/metrics', MetricsHandler,)
+    ]).listen(config.metrics_port)
+    asyncio.get_event_loop().run_until_complete(logic.twitter_streams())
+
+
+def _run_api(config):
     class StocksHandler(JsonRequestHandler):
         async def _get(self):
             return await logic.stocks()
@@ -55,7 +300,7 @@ def run_server(config_path, is_stream_process):
             )
             exclude_neutral = bool(self.get_argument("no_neutral", False))
             assert to_time >= from_time
-            stock_id = await db.stock_by_filter(filter)
+            stock_id = await logic.stock_by_filter(filter)
             positive, negative, neutral = await logic.stock_stats(stock_id, from_time, to_time, exclude_neutral)
             return {
                 "positive": positive,
@@ -63,30 +308,113 @@ def run_server(config_path, is_stream_process):
                 "neutral": neutral
             }
 
-    config = Configuration.from_file(config_path)
-    logging.basicConfig(level=config.log_level)
+    class ExportHandler(ExportRequestHandler):
+        async def _rows(self):
+            filter = self.get_argument("q", "")
+            assert filter != ""
+            from_time = datetime.datetime.fromtimestamp(
+                int(self.get_argument("from", 0))
+            )
+            to_time = datetime.datetime.fromtimestamp(
+                int(self.get_argument("to", 0))
+            )
+            assert to_time >= from_time
+            stock_id = await logic.stock_by_filter(filter)
+            return db.stock_tweets(stock_id, from_time, to_time, timeout=config.export_timeout)
+
     logic = AppLogic(config)
     asyncio.get_event_loop().run_until_complete(logic.initialize())
+    asyncio.get_event_loop().run_until_complete(logic.load_stock_ids())
+    AsyncIOMainLoop().install()
+    hub = LiveHub()
+    hub.start()
+    asyncio.ensure_future(logic.follow_sentiment(hub))
+    application = Application([
+        (r'/stocks', StocksHandler,),
+        (r'/stats', StatsHandler,),
+        (r'/export', ExportHandler,),
+        (r'/live', LiveRequestHandler, {"hub": hub}),
+        (r'/metrics', MetricsHandler,)
+    ])
+    application.listen(config.port)
+    asyncio.get_event_loop().run_forever()
+
+
+def run_server(config_path, is_stream_process):
+    config = Configuration.from_file(config_path)
+    log.setup(config.log_level, config.log_sampling)
+    serialization.use(config.json_backend)
+    logging.info("Run server (JSON backend {0})".format(serialization.backend))
     if is_stream_process:
-        asyncio.get_event_loop().run_until_complete(logic.twitter_streams())
+        _run_stream(config)
     else:
-        AsyncIOMainLoop().install()
-        application = Application([
-            (r'/stocks', StocksHandler,),
-            (r'/stats', StatsHandler,)
-        ])
-        application.listen(config.port)
-        asyncio.get_event_loop().run_forever()
+        _run_api(config)
+
+
+def check(config_path):
+    """
+    Validate configuration and database connection
+    :param config_path: path to config file
+    :type config_path: str
+    :return: exit code (0 if everything is OK)
+    :rtype: int
+    """
+    try:
+        config = Configuration.from_file(config_path)
+    except Exception:
+        logging.exception("Wrong configuration {0}".format(config_path))
+        return 1
+    log.setup(config.log_level, config.log_sampling)
+    try:
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(asyncio.wait_for(AppLogic(config).initialize(), CHECK_TIMEOUT))
+        assert loop.run_until_complete(asyncio.wait_for(db.ping(), CHECK_TIMEOUT))
+    except Exception:
+        logging.exception("Database check failed")
+        return 1
+    logging.info("Configuration and database are OK")
+    return 0
+
+
+def _arguments(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("config", nargs="?", default=os.path.join(os.path.dirname(__file__), "config.json"),
+                        help="configuration file")
+    parser.add_argument("--check", action="store_true",
+                        help="validate configuration and database connection, then exit")
+    return parser.parse_args()
 
 
 def main():
-    if len(sys.argv) == 2:
-        config = sys.argv[1]
-    else:
-        config = os.path.join(os.path.dirname(__file__), "config.json")
+    """
+    Run API and streaming processes
+    """
+    args = _arguments("Run API and Twitter streaming processes")
+    if args.check:
+        sys.exit(check(args.config))
     fork_result = os.fork()
-    run_server(config, fork_result == 0)
+    run_server(args.config, fork_result == 0)
     if fork_result != 0:
         def kill_child():
             os.kill(fork_result, signal.SIGTERM)
-        atexit.register(kill_child)
\ No newline at end of file
+        atexit.register(kill_child)
+
+
+def api_main():
+    """
+    Run only API process
+    """
+    args = _arguments("Run API process")
+    if args.check:
+        sys.exit(check(args.config))
+    run_server(args.config, False)
+
+
+def stream_main():
+    """
+    Run only Twitter streaming process
+    """
+    args = _arguments("Run Twitter streaming process")
+    if args.check:
+        sys.exit(check(args.config))
+    run_server(args.config, True)
@@ -0,0 +1,91 @@
+"""
+Local stand-in for Watson NLC classify API (for benchmarks and evaluation).
+"""
+import argparse
+import asyncio
+import csv
+import json
+import random
+from tornado.platform.asyncio import AsyncIOMainLoop
+from tornado.web import Application, RequestHandler
+
+
+CLASSES = ["positive", "negative", "neutral"]
+
+
+class _ClassifyHandler(RequestHandler):
+    def initialize(self, labels, latency, error_rate):
+        self.labels = labels
+        self.latency = latency
+        self.error_rate = error_rate
+
+    async def get(self, classifier_id):
+        text = self.get_argument("text", "")
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        # Same classifier always answers same way for same text
+        rnd = random.Random(classifier_id + "\0" + text)
+        top = self.labels.get(text, "neutral")
+        if rnd.random() < self.error_rate:
+            top = rnd.choice([class_name for class_name in CLASSES if class_name != top])
+        classes = [{"class_name": top, "confidence": 0.9}] + \
+                  [{"class_name": class_name, "confidence": 0.05}
+                   for class_name in CLASSES if class_name != top]
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps({
+            "classifier_id": classifier_id,
+            "text": text,
+            "top_class": top,
+            "classes": classes
+        }))
+
+
+def read_labels(paths):
+    """
+    Read text-class pairs from dataset CSVs
+    :param paths: CSV paths (rows like text,class)
+    :type paths: list[str]
+    :return: text-class dict
+    :rtype: dict[str, str]
+    """
+    labels = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as src:
+            for row in csv.reader(src):
+                labels[row[0]] = row[1]
+    return labels
+
+
+def make_application(labels, latency=0.0, error_rate=0.0):
+    """
+    Build stub application
+    :param labels: known text-class dict (unknown texts will be "neutral")
+    :type labels: dict[str, str]
+    :param latency: delay before each answer (seconds)
+    :type latency: float
+    :param error_rate: part of wrong answers (in [0..1])
+    :type error_rate: float
+    :return: tornado application
+    :rtype: Application
+    """
+    return Application([
+        (r'/natural-language-classifier/api/v1/classifiers/([^/]+)/classify', _ClassifyHandler, {
+            "labels": labels,
+            "latency": latency,
+            "error_rate": error_rate
+        })
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run local Watson NLC stub")
+    parser.add_argument("datasets", nargs="*", help="CSVs with text,class rows")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--latency", type=float, default=0.0, help="answer delay (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="part of wrong answers")
+    args = parser.parse_args()
+
+    AsyncIOMainLoop().install()
+    make_application(read_labels(args.datasets), args.latency, args.error_rate).listen(args.port)
+    print("Watson NLC stub listening on http://127.0.0.1:{0}/natural-language-classifier".format(args.port))
+    asyncio.get_event_loop().run_forever()
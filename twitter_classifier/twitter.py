@@ -6,13 +6,14 @@ from datetime import datetime, timedelta
 from email.utils import parsedate_tz
 from urllib.request import unquote
 import re
+from .metrics import TWEETS_RECEIVED, STAGE_LATENCY
 
 
 class TwitterClient:
     """
     Twitter client
     """
-    def __init__(self, consumer_key, consumer_secret, access_token, access_token_secret, timeout=2):
+    def __init__(self, consumer_key, consumer_secret, access_token, access_token_secret, timeout=2, base_url=None):
         """
         Initialize client
         :param consumer_key: consumer key
@@ -25,8 +26,13 @@ class TwitterClient:
         :type access_token_secret: str
         :param timeout: timeout between calls to Twitter (in one search session)
         :type timeout: float
+        :param base_url: optional API url template for peony (e.g. "http://127.0.0.1:8020/{api}/{version}")
+        :type base_url: str|None
         """
-        self.peony = PeonyClient(consumer_key, consumer_secret, access_token, access_token_secret)
+        kwargs = {}
+        if base_url is not None:
+            kwargs["base_url"] = base_url
+        self.peony = PeonyClient(consumer_key, consumer_secret, access_token, access_token_secret, **kwargs)
         self.timeout = timeout
 
     @staticmethod
@@ -45,11 +51,14 @@ class TwitterClient:
         return dt - timedelta(seconds=time_tuple[-1])
 
     async def stream_handle(self, tweet_handler, text_preprocessor, **kwargs):
+        clean_latency = STAGE_LATENCY.labels("clean")
         ctx = self.peony.stream.statuses.filter.post(**kwargs)
         async with ctx as stream:
             async for tweet in stream:
                 if 'text' in tweet:
-                    text = TwitterClient._clean(text_preprocessor(tweet['text']))
+                    TWEETS_RECEIVED.inc()
+                    with clean_latency.time():
+                        text = TwitterClient._clean(text_preprocessor(tweet['text']))
                     time = TwitterClient._time(tweet['created_at'])
                     uid = tweet['user']['id']
                     await tweet_handler(tweet['text'], text, time, uid)
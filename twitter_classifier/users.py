@@ -0,0 +1,7 @@
+"""
+Users table notifications.
+"""
+
+
+# create.sql trigger sends it after every change of users table (tweets.k are already updated then)
+USERS_CHANNEL = "users_changed"
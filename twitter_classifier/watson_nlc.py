@@ -6,27 +6,32 @@ import json
 from urllib.request import quote
 import asyncio
 import aiohttp
+from .metrics import CLASSIFIER_CALLS
 
 
-class All(asyncio.Future):
+def vote(classes, default_class, min_votes=2):
     """
-    Wait while all futures will be finished
+    Choose class with biggest votes count
+    :param classes: classes returned by individual classifiers
+    :type classes: list[str]
+    :param default_class: default class (if haven't "top" voted-class)
+    :type default_class: str
+    :param min_votes: min votes count for "top" class
+    :type min_votes: int
+    :return: top voted class or default
+    :rtype: str
     """
-
-    def __init__(self, futures):
-        """
-        :param futures: futures
-        :type futures: list[asyncio.Future]
-        """
-        super(All, self).__init__()
-        self._undone = len(futures)
-        for future in futures:
-            future.add_done_callback(self._one_done)
-
-    def _one_done(self, *args, **kwargs):
-        self._undone -= 1
-        if self._undone <= 0:
-            self.set_result(None)
+    counts = {}
+    for class_name in classes:
+        counts[class_name] = counts.get(class_name, 0) + 1
+    max_class = None
+    for class_name, count in counts.items():
+        if max_class is None or count > counts[max_class]:
+            max_class = class_name
+    if counts.get(max_class, 0) < min_votes:
+        return default_class
+    else:
+        return max_class
 
 
 class WatsonException(Exception):
@@ -42,9 +47,9 @@ class AsyncNaturalLanguageClassifier:
     """
     Async wrapper for traine d Watson NLC instances
     """
+    DEFAULT_BASE_URL = "https://gateway.watsonplatform.net/natural-language-classifier"
 
-    def __init__(self, username, password,
-                 base_url="https://gateway.watsonplatform.net/natural-language-classifier"):
+    def __init__(self, username, password, base_url=DEFAULT_BASE_URL):
         """
         Initialize wrapper
         :param username: user name
@@ -86,11 +91,16 @@ class AsyncNaturalLanguageClassifier:
         url = "{0}/api/v1/classifiers/{1}/classify?text={2}".format(
             self.base_url, classifier_id, quote(text))
         auth = aiohttp.BasicAuth(self.username, self.password)
-        async with self.client.get(url, auth=auth) as response:
-            response_text = await response.text()
-            if response.status != 200:
-                raise WatsonException(response.status, response_text)
-            result = json.loads(response_text)
+        try:
+            async with self.client.get(url, auth=auth) as response:
+                response_text = await response.text()
+                CLASSIFIER_CALLS.labels(str(response.status)).inc()
+                if response.status != 200:
+                    raise WatsonException(response.status, response_text)
+                result = json.loads(response_text)
+        except aiohttp.ClientError:
+            CLASSIFIER_CALLS.labels("error").inc()
+            raise
         top = result['top_class']
         classes = OrderedDict()
         for item in result['classes']:
@@ -108,23 +118,8 @@ class AsyncNaturalLanguageClassifier:
         :type default_class: str
         :return: top voted class or default
         :rtype: str
+        :raises WatsonException, aiohttp.ClientError: if any classifier call failed
         """
-        async def _one_classify(classifier_id):
-            results[classifier_id], _ = await self.classify(classifier_id, text)
-
-        results = {}
-        loop = asyncio.get_event_loop()
-        classifier_futures = [loop.create_task(_one_classify(classifier_id))
-                              for classifier_id in classifier_ids]
-        await All(classifier_futures)
-        counts = {}
-        for _, class_name in results.items():
-            counts[class_name] = counts.get(class_name, 0) + 1
-        max_class = None
-        for class_name, count in counts.items():
-            if max_class is None or count > counts[max_class]:
-                max_class = class_name
-        if counts.get(max_class, 0) <= 1:
-            return default_class
-        else:
-            return max_class
+        results = await asyncio.gather(*[self.classify(classifier_id, text)
+                                         for classifier_id in classifier_ids])
+        return vote([top for top, _ in results], default_class)
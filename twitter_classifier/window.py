@@ -0,0 +1,169 @@
+"""
+In-memory sliding window of weighted sentiment sums.
+Keeps per-second positive/negative/neutral sums of each stock for last `span` seconds in ring arrays,
+    so stats of recent periods are calculated without database queries.
+"""
+import array
+import calendar
+import datetime
+import logging
+import time
+from .metrics import CACHE_LOOKUPS
+
+
+CLASSES = ("positive", "negative", "neutral")
+# Notification which makes API process reload window (e.g. after reclassification by backfill)
+RELOAD_CHANNEL = "window_reload"
+
+
+class _StockBuckets:
+    def __init__(self, size):
+        self.sums = [array.array("d", bytes(8 * size)) for _ in CLASSES]
+
+
+class SentimentWindow:
+    """
+    Per-stock ring buffers of 1-second buckets.
+    Slot of second s is s % span. Slots are zeroed when window moves forward,
+        so every slot always contains sums of one second in (head - span, head].
+    """
+
+    def __init__(self, span=86400):
+        """
+        :param span: window length (seconds)
+        :type span: int
+        """
+        assert span > 0
+        self.span = span
+        self.stocks = {}
+        self.head = int(time.time())
+        self.ready = False
+        self.generation = 0
+        self._buffered = []
+        self._hits = CACHE_LOOKUPS.labels("window", "hit")
+        self._misses = CACHE_LOOKUPS.labels("window", "miss")
+
+    @staticmethod
+    def timestamp(value):
+        """
+        Convert naive UTC datetime (as stored in tweets.time) to unix time
+        :type value: datetime.datetime
+        :rtype: int
+        """
+        return calendar.timegm(value.timetuple())
+
+    def _advance(self, second):
+        if second <= self.head:
+            return
+        if second - self.head >= self.span:
+            for buckets in self.stocks.values():
+                for sums in buckets.sums:
+                    sums[:] = array.array("d", bytes(8 * self.span))
+        else:
+            for moved in range(self.head + 1, second + 1):
+                slot = moved % self.span
+                for buckets in self.stocks.values():
+                    for sums in buckets.sums:
+                        sums[slot] = 0.0
+        self.head = second
+
+    def _add(self, stock_id, second, classification, k):
+        if classification not in CLASSES:
+            return
+        self._advance(max(int(time.time()), second))
+        if second <= self.head - self.span:
+            return
+        buckets = self.stocks.get(stock_id)
+        if buckets is None:
+            buckets = self.stocks[stock_id] = _StockBuckets(self.span)
+        buckets.sums[CLASSES.index(classification)][second % self.span] += k
+
+    def reset(self):
+        """
+        Forget all data and buffer new events until next hydration
+        (hydrations started before reset are discarded)
+        """
+        self.ready = False
+        self.generation += 1
+        self.stocks = {}
+        self._buffered = []
+
+    async def hydrate(self, rows):
+        """
+        Load sums from database.
+        Sums are collected in separate window and replace current ones only when loading is finished.
+        :param rows: rows of db.recent_sentiment
+        :type rows: db._ServerCursor
+        :return: are loaded sums used (False if window was reset during loading)
+        :rtype: bool
+        """
+        generation = self.generation
+        loaded = SentimentWindow(self.span)
+        max_tweet_id = 0
+        async with rows:
+            async for stock_id, second, classification, k, tweet_id in rows:
+                loaded._add(stock_id, int(second), classification, float(k))
+                max_tweet_id = max(max_tweet_id, tweet_id)
+        if generation != self.generation:
+            logging.info("Sentiment window was reset during loading, loaded sums are discarded")
+            return False
+        # Ingest process classifies tweets one by one in id order,
+        # so events of tweets with bigger id weren't included in hydration query
+        for event in self._buffered:
+            if event["tweet_id"] > max_tweet_id:
+                loaded._add(event["stock_id"], int(event["time"]), event["classification"], event["k"])
+        self.stocks = loaded.stocks
+        self.head = loaded.head
+        self._buffered = []
+        self.ready = True
+        logging.info("Sentiment window loaded for {0} stocks".format(len(self.stocks)))
+        return True
+
+    def hydration_start(self):
+        """
+        :return: oldest time to load by hydration (naive UTC)
+        :rtype: datetime.datetime
+        """
+        return datetime.datetime.utcfromtimestamp(int(time.time()) - self.span + 1)
+
+    def publish(self, event):
+        """
+        Add sentiment notification (see live.sentiment_event)
+        :type event: dict
+        """
+        if not self.ready:
+            self._buffered.append(event)
+        else:
+            self._add(event["stock_id"], int(event["time"]), event["classification"], event["k"])
+
+    def stats(self, stock_id, from_time, to_time):
+        """
+        Get weighted sums of stock in period if it is inside window
+        :param stock_id: stock id
+        :type stock_id: int
+        :param from_time: not analyze older tweets
+        :type from_time: datetime.datetime
+        :param to_time: not analyze newer tweets
+        :type to_time: datetime.datetime
+        :return: positive/negative/neutral sums or None if period isn't inside window
+        :rtype: (float, float, float)|None
+        """
+        self._advance(int(time.time()))
+        first = SentimentWindow.timestamp(from_time)
+        last = min(SentimentWindow.timestamp(to_time), self.head)
+        if not self.ready or first <= self.head - self.span:
+            self._misses.inc()
+            return None
+        self._hits.inc()
+        buckets = self.stocks.get(stock_id)
+        if buckets is None or first > last:
+            return 0.0, 0.0, 0.0
+        start = first % self.span
+        end = last % self.span
+        result = []
+        for sums in buckets.sums:
+            if start <= end:
+                result.append(sum(sums[start:end + 1]))
+            else:
+                result.append(sum(sums[start:]) + sum(sums[:end + 1]))
+        return tuple(result)